@@ -0,0 +1,66 @@
+"""
+Benchmark RstHeaderTree parsing against documents with 100 to 100k headers.
+
+Run from the package root::
+
+    python benchmarks/bench_headers.py
+
+Each document repeats the same few section titles (so duplicate titles are
+exercised) over three header levels. The per-header cost should stay flat as
+the document grows, i.e. parsing scales linearly, and a cursor lookup
+followed by a same-level jump should cost about the same at every size.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.headersUtils import RstHeaderTree  # noqa: E402
+
+SIZES = (100, 1000, 10000, 100000)
+ADORNMENTS = ('=', '-', '~')
+TITLES = ('Examples', 'Usage', 'Notes', 'See also')
+PARAGRAPH = 'Some body text for the section, long enough to look like prose.\n'
+
+
+def make_document(num_headers):
+    parts = []
+    for i in range(num_headers):
+        title = TITLES[i % len(TITLES)]
+        parts.append('%s\n%s\n\n%s\n' % (title, ADORNMENTS[i % 3] * len(title), PARAGRAPH))
+    return ''.join(parts)
+
+
+def best_of(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def lookups(tree, positions):
+    for pos in positions:
+        header = tree.belong_to(pos)
+        tree.next(header, same_or_high=True)
+        tree.prev(header, same_or_high=True)
+
+
+def main():
+    print('%10s %12s %14s %14s' % ('headers', 'parse (s)', 'us / header', 'us / lookup'))
+    for size in SIZES:
+        text = make_document(size)
+        elapsed = best_of(lambda: RstHeaderTree(text))
+        tree = RstHeaderTree(text)
+        assert len(tree.headers) == size
+        positions = [random.randrange(len(text)) for _ in range(1000)]
+        lookup = best_of(lambda: lookups(tree, positions)) / len(positions)
+        print('%10d %12.4f %14.2f %14.2f' % (size, elapsed, elapsed / size * 1e6, lookup * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Headless benchmark suite: the core functions and the commands of the plugin
+against generated reSt documents of 1k to 1M lines, run on the fake sublime
+API of benchmarks/fakes.
+
+Run from the package root::
+
+    python benchmarks/bench_suite.py [--max-lines N] [--only SUBSTRING] [--no-memory]
+
+For each document size and operation it prints the wall time of one run
+and the peak memory allocated during a second, traced, run. Commands are
+timed on a freshly opened view (opening it is not timed), including the
+timeouts they queue, so the first-use cost of the indexes shows up.
+"""
+import argparse
+
+from harness import (load_plugin, make_document, make_table, measure, open_view,
+                     set_cursor, StringSource, sublime, sublime_plugin)
+
+main, tables = load_plugin()
+
+from reStAssured.utils.headersUtils import RstHeaderTree, HeaderIndex  # noqa: E402
+from reStAssured.utils import footnotesUtils as fu  # noqa: E402
+from reStAssured.utils import listsUtils as slu  # noqa: E402
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+
+def match_lists(text):
+    for line in text.split("\n"):
+        (slu.EMPTY_LIST_PATTERN.match(line) or slu.ROMAN_PATTERN.match(line)
+         or slu.ORDER_LIST_PATTERN.match(line) or slu.UNORDER_LIST_PATTERN.match(line)
+         or slu.NONLIST_PATTERN.match(line))
+
+
+def table_round_trip(lines):
+    table = tables.parse_table(lines)
+    tables.draw_table("", table)
+
+
+def core_operations(text, num_lines):
+    table_lines = make_table(max(10, num_lines // 100)).splitlines()
+    return [
+        ("headers: RstHeaderTree parse", lambda _: RstHeaderTree(text)),
+        ("headers: HeaderIndex rebuild", lambda _: HeaderIndex().rebuild(StringSource(text))),
+        ("footnotes: scan", lambda _: fu.scan_footnotes(text)),
+        ("footnotes: FootnoteIndex rebuild", lambda _: fu.FootnoteIndex().rebuild(StringSource(text))),
+        ("footnotes: renumber", lambda _: fu.renumber_footnotes(text, reorder_definitions=True)),
+        ("lists: match every line", lambda _: match_lists(text)),
+        ("tables: parse + draw %d rows" % len(table_lines), lambda _: table_round_trip(table_lines)),
+    ]
+
+
+def command(name, args=None):
+    def run(view):
+        view.run_command(name, args)
+        sublime.run_timeouts()
+        # large documents get their index built in the background: retry
+        view.run_command(name, args)
+    return run
+
+
+def command_operations(text, num_lines):
+    middle = len(text) // 2
+    reference = text.index("]_", middle) - 1
+    ordered = text.index("1. an ordered item", middle) + len("1. an ordered item")
+    table = make_table(max(10, num_lines // 100))
+    # the same, as a grid table with narrow columns for the reflows to wrap
+    narrow = "\n".join(tables.draw_table("", tables.parse_table(table.splitlines()), [6, 10, 6])) + "\n"
+
+    def view_at(pt, content=text):
+        def setup():
+            view = open_view(content)
+            sublime.run_timeouts()
+            set_cursor(view, pt)
+            return view
+        return setup
+
+    return [
+        ("open view (listeners)", lambda _: (open_view(text), sublime.run_timeouts()), None),
+        ("jump_forward_same_level", command("jump_forward_same_level"), view_at(middle)),
+        ("header_fold_to_level 2", command("header_fold_to_level", {"level": 2}), view_at(middle)),
+        ("header_change_level_up", command("header_change_level_up"),
+         view_at(text.index("Section", middle))),
+        ("go_to_footnote_definition", command("go_to_footnote_definition"), view_at(reference)),
+        ("insert_footnote", command("insert_footnote"), view_at(middle)),
+        ("renumber_footnotes", command("renumber_footnotes"), view_at(0)),
+        ("smart_list", lambda view: view.run_command("smart_list"), view_at(ordered)),
+        ("table (%d rows)" % (table.count("\n") - 1), lambda view: view.run_command("table"),
+         view_at(0, table)),
+        ("flowtable (%d rows)" % (table.count("\n") - 1), lambda view: view.run_command("flowtable"),
+         view_at(0, narrow)),
+        ("flowtable balanced", lambda view: view.run_command("flowtable", {"balanced": True}),
+         view_at(0, narrow)),
+    ]
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--max-lines", type=int, default=SIZES[-1])
+    parser.add_argument("--only", default="", help="only run operations containing this")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory runs")
+    options = parser.parse_args()
+
+    print("%10s  %-40s %12s %14s" % ("lines", "operation", "time (ms)", "peak mem (KB)"))
+    for num_lines in SIZES:
+        if num_lines > options.max_lines:
+            break
+        text = make_document(num_lines)
+        operations = [(name, op, None) for name, op in core_operations(text, num_lines)]
+        operations += command_operations(text, num_lines)
+        for name, operation, setup in operations:
+            if options.only not in name:
+                continue
+            elapsed, peak = measure(operation, setup, memory=not options.no_memory)
+            print("%10d  %-40s %12.2f %14s" % (num_lines, name, elapsed * 1000,
+                                                "-" if peak is None else "%.0f" % (peak / 1024)))
+            for view in list(sublime_plugin.views):
+                sublime_plugin.close_view(view)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,180 @@
+"""
+Keystroke replay benchmark: feeds a typing session through the key bound
+commands (enter -> smart_list, tab -> header_markings_filler or
+indent_list_item, * ` | -> the surround commands), plain character
+inserts, and the listeners they trigger, on a fake view (benchmarks/fakes)
+of a generated document, and reports per-keystroke latency percentiles.
+
+Run from the package root::
+
+    python benchmarks/bench_typing.py [--lines N] [--trace FILE] [--record FILE] [--budget-ms MS]
+
+A trace is a JSON list of keys: single characters, or "enter", "tab" and
+"shift+tab". Without --trace a built-in session is replayed (a header with
+its underline, prose with inline markup, nested lists), and --record saves
+it as a trace file to start from.
+
+The latencies are those of the plugin: the time the stand-in editor
+spends on its own side of the edits (see sublime.editor_seconds) is taken
+out, and reported on its own row for reference.
+
+Between keystrokes the virtual clock moves on by --interval ms, running
+the debounced work that falls due (footnote marking and the like). That
+work is reported as its own row, since it also runs on the UI thread.
+
+Exits with status 1 if the p99 of the plugin's keystrokes is over
+--budget-ms (1 ms by default).
+"""
+import argparse
+import json
+import re
+import sys
+import time
+
+from harness import load_plugin, make_document, open_view, set_cursor, sublime, sublime_plugin
+
+main, tables = load_plugin()
+
+SESSION = (
+    "Installation notes\n==================<tab>\n\n"
+    "Run the *installer* with `sudo` and check the |version| first, then read the\n"
+    "release notes [1]_ before going any further.\n\n"
+    "1. Download the archive<enter>Unpack it<enter><tab>in your home folder<enter>"
+    "or anywhere else<enter><shift+tab>Run the installer<enter><enter>\n"
+    "- Some *emphasis* here<enter>some ``literal`` there<enter><enter>\n"
+)
+
+# the contexts of the key bindings in Default (Linux).sublime-keymap
+LIST_ITEM = re.compile(r"^\s*([-+*]|([(]?(\d+|#|[a-y]|[A-Y]|[MDCLXVImdclxvi]+))[).])\s+")
+EMPTY_LIST_ITEM = re.compile(LIST_ITEM.pattern + "$")
+ADORNMENT_LINE = re.compile(r"([!\"#$%&'\\()*+,\-./:;<=>?@\[\]\^_`{|}~])\1\1+$")
+SURROUND = {"*": "emphasis", "`": "back_tick", "|": "substitution"}
+
+
+def session_trace(session=SESSION):
+    keys = []
+    for token in re.split(r"(<[a-z+]+>)", session):
+        if token.startswith("<"):
+            keys.append(token[1:-1])
+        else:
+            keys.extend(token)
+    return keys
+
+
+def resolve(view, key):
+    """(command, args) a key runs in view, as the key binding contexts decide"""
+    pt = view.sel()[0].begin()
+    line = view.line(pt)
+    before = view.substr(sublime.Region(line.begin(), pt))
+    after = view.substr(sublime.Region(pt, line.end()))
+    if key in SURROUND:
+        return SURROUND[key], {}
+    if key in ("enter", "\n"):
+        if LIST_ITEM.search(before):
+            return "smart_list", {}
+        return "insert", {"characters": "\n"}
+    if key == "tab":
+        if ADORNMENT_LINE.match(before):
+            return "header_markings_filler", {}
+        if EMPTY_LIST_ITEM.search(before) and not after:
+            return "indent_list_item", {}
+        return "insert", {"characters": "    "}
+    if key == "shift+tab":
+        if EMPTY_LIST_ITEM.search(before) and not after:
+            return "indent_list_item", {"reverse": True}
+        return "header_folding_on_off", {}
+    return "insert", {"characters": key}
+
+
+def replay(view, keys, interval):
+    """
+    per key (command, plugin seconds, editor seconds), and the plugin
+    seconds of each idle tick with due work
+    """
+    samples, idle = [], []
+    for key in keys:
+        command, args = resolve(view, key)
+        editor = sublime.editor_seconds[0]
+        start = time.perf_counter()
+        view.run_command(command, args)
+        elapsed = time.perf_counter() - start
+        editor = sublime.editor_seconds[0] - editor
+        samples.append((command, elapsed - editor, editor))
+        if sublime._timeouts:
+            editor = sublime.editor_seconds[0]
+            start = time.perf_counter()
+            sublime.run_timeouts(interval)
+            idle.append(time.perf_counter() - start - (sublime.editor_seconds[0] - editor))
+    return samples, idle
+
+
+def percentiles(values):
+    values = sorted(values)
+
+    def at(p):
+        return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+    return at(50), at(95), at(99), values[-1]
+
+
+def print_row(name, values):
+    if values:
+        print("%-34s %6d %9.3f %9.3f %9.3f %9.3f" % ((name, len(values)) + tuple(
+            v * 1000 for v in percentiles(values))))
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=2000, help="size of the document typed into")
+    parser.add_argument("--trace", help="JSON list of keys to replay")
+    parser.add_argument("--record", help="save the built-in session as a trace file")
+    parser.add_argument("--repeat", type=int, default=20, help="replays of the trace")
+    parser.add_argument("--interval", type=float, default=120, help="ms between keystrokes")
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    options = parser.parse_args()
+
+    if options.trace:
+        with open(options.trace, encoding="utf-8") as f:
+            keys = json.load(f)
+    else:
+        keys = session_trace()
+        if options.record:
+            with open(options.record, "w", encoding="utf-8") as f:
+                json.dump(keys, f, indent=0)
+    text = make_document(options.lines)
+    # type on a blank line of its own, halfway through the document
+    pt = text.index("\n\n", len(text) // 2) + 2
+    text = text[:pt] + "\n\n" + text[pt:]
+
+    def run_session():
+        samples, idle = [], []
+        for _ in range(options.repeat):
+            view = open_view(text)
+            sublime.run_timeouts()
+            set_cursor(view, pt)
+            more_samples, more_idle = replay(view, keys, options.interval)
+            samples += more_samples
+            idle += more_idle
+            sublime_plugin.close_view(view)
+        return samples, idle
+
+    samples, idle = run_session()
+
+    print("%d keys x %d replays, typed into a %d line document\n" % (len(keys), options.repeat, options.lines))
+    print("%-34s %6s %9s %9s %9s %9s" % ("keystrokes", "count", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    by_command = {}
+    for command, seconds, _ in samples:
+        by_command.setdefault(command, []).append(seconds)
+    for command in sorted(by_command):
+        print_row(command, by_command[command])
+    print_row("all keystrokes", [s[1] for s in samples])
+    print_row("idle ticks with due work", idle)
+    print_row("(stand-in editor's own share)", [s[2] for s in samples])
+
+    p99 = percentiles([s[1] for s in samples])[2] * 1000
+    if p99 > options.budget_ms:
+        print("\np99 keystroke latency %.3f ms is over the %.3f ms budget" % (p99, options.budget_ms))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
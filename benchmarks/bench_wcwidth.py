@@ -0,0 +1,110 @@
+"""
+Benchmark of the character width lookups: the two-level table of
+wcwidth/table_width.py against the binary searches over the interval
+tables it replaced (kept in check_wcwidth.py, and looked up below as
+legacy_wcwidth/legacy_wcswidth), per character and over table cells,
+plus the table reformat that calls them.
+
+Run from the package root::
+
+    python benchmarks/bench_wcwidth.py [--repeat N]
+"""
+import argparse
+import importlib
+import sys
+import time
+
+from harness import load_plugin, make_table
+
+main, tables = load_plugin()
+
+from reStAssured.utils import tablesUtils  # noqa: E402
+from check_wcwidth import NONZERO_COMBINING, WIDE_EASTASIAN, bisearch  # noqa: E402
+
+# the module, which the package hides behind its wcwidth function
+wc = importlib.import_module("reStAssured.wcwidth.wcwidth.wcwidth")
+
+
+def legacy_wcwidth(char):
+    ucs = ord(char)
+    if ucs == 0 or ucs == 0x034f or 0x200b <= ucs <= 0x200f or 0x2028 <= ucs <= 0x202e \
+            or 0x2060 <= ucs <= 0x2063:
+        return 0
+    if ucs < 32 or 0x7f <= ucs < 0xa0:
+        return -1
+    if bisearch(ucs, NONZERO_COMBINING):
+        return -1
+    return 1 + bisearch(ucs, WIDE_EASTASIAN)
+
+
+def legacy_wcswidth(text):
+    width = 0
+    for char in text:
+        wcw = legacy_wcwidth(char)
+        if wcw < 0:
+            if bisearch(ord(char), NONZERO_COMBINING):
+                continue
+            return -1
+        width += wcw
+    return width
+
+
+CELLS = {
+    "ascii cells": ["row %d" % i for i in range(50)] + ["some text in the middle"] * 50,
+    "accented cells": ["café crème brûlée %d" % i for i in range(100)],
+    "cjk cells": ["日本語のテキスト %d" % i for i in range(100)],
+    "emoji cells": ["done ✅ party \U0001f389 %d" % i for i in range(100)],
+}
+
+
+def best_of(repeat, operation):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    print("%-36s %14s %14s %8s" % ("operation", "legacy (us)", "table (us)", "speedup"))
+
+    def row(name, legacy, table):
+        before, after = best_of(options.repeat, legacy), best_of(options.repeat, table)
+        print("%-36s %14.1f %14.1f %7.1fx" % (name, before * 1e6, after * 1e6, before / after))
+
+    chars = [chr(ucs) for ucs in range(0x20, 0x3000, 7)] + [chr(ucs) for ucs in range(0x4e00, 0x4f00)]
+    row("wcwidth, %d mixed characters" % len(chars),
+        lambda: [legacy_wcwidth(c) for c in chars], lambda: [wc.wcwidth(c) for c in chars])
+    for name, cells in CELLS.items():
+        row("wcswidth, 100 %s" % name,
+            lambda: [legacy_wcswidth(c) for c in cells], lambda: [wc.wcswidth(c) for c in cells])
+
+    lines = make_table(500).splitlines()
+    table = tables.parse_table(lines)
+    # the table code measures cells through the wcwidth package
+    package = tablesUtils.wcwidth
+    real = package.wcswidth
+    package.wcswidth = legacy_wcswidth
+    try:
+        legacy = best_of(options.repeat, lambda: tables.draw_table("", table))
+    finally:
+        package.wcswidth = real
+    current = best_of(options.repeat, lambda: tables.draw_table("", table))
+    print("%-36s %14.1f %14.1f %7.1fx" % ("draw_table, 500 rows", legacy * 1e6, current * 1e6, legacy / current))
+
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        del sys.modules[wc.__name__.rsplit(".", 1)[0] + ".table_width"]
+        importlib.import_module(wc.__name__.rsplit(".", 1)[0] + ".table_width")
+    print("\nimport of table_width.py (cached bytecode): %.1f us"
+          % ((time.perf_counter() - start) / options.repeat * 1e6))
+
+
+if __name__ == "__main__":
+    main_()
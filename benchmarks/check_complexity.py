@@ -0,0 +1,268 @@
+"""
+Complexity regression check: times the core routines on synthetic reSt
+corpora of growing size, fits the growth exponent k of time ~ size**k and
+fails if a routine scales worse than it should, e.g. an accidental
+quadratic like the former text.find(raw) of RstHeaderTree._parse.
+
+Run from the package root::
+
+    python benchmarks/check_complexity.py [--update-baseline] [--only SUBSTRING]
+
+Exits with status 1 if any exponent is over the limit of its class
+("linear" routines must stay under 1.25, "sublinear" ones, i.e. constant
+or logarithmic per call, under 0.35).
+
+The measured exponents and times are compared with (or, with
+--update-baseline, written to) benchmarks/complexity_baseline.json, which
+is meant to be diffed between versions.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from harness import load_plugin, make_document, open_view, set_cursor, StringSource, sublime, sublime_plugin
+
+main, tables = load_plugin()
+
+from reStAssured.utils.headersUtils import RstHeaderTree, HeaderIndex  # noqa: E402
+from reStAssured.utils import footnotesUtils as fu  # noqa: E402
+from reStAssured.utils import listsUtils as slu  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "complexity_baseline.json")
+SIZES = (4000, 8000, 16000, 32000, 64000)   # lines
+LIMITS = {"linear": 1.25, "sublinear": 0.35}
+REPEAT = 3
+
+
+class TypingSource(object):
+    """
+    Text source of a document being typed into at one point, whose edits
+    (unlike those of a plain string) don't cost a copy of the document:
+    the text is base with what has been typed inserted at pos.
+    """
+
+    def __init__(self, base, pos):
+        self.base = base
+        self.pos = pos
+        self.typed = ""
+
+    def type(self, text):
+        self.typed += text
+
+    def size(self):
+        return len(self.base) + len(self.typed)
+
+    def _last_newline_before(self, pt):
+        pos, typed = self.pos, len(self.typed)
+        if pt > pos + typed:
+            i = self.base.rfind("\n", pos, pt - typed)
+            if i != -1:
+                return i + typed
+        if pt > pos:
+            i = self.typed.rfind("\n", 0, min(pt - pos, typed))
+            if i != -1:
+                return pos + i
+        return self.base.rfind("\n", 0, min(pt, pos))
+
+    def _first_newline_from(self, pt):
+        pos, typed = self.pos, len(self.typed)
+        if pt < pos:
+            i = self.base.find("\n", pt, pos)
+            if i != -1:
+                return i
+        if pt < pos + typed:
+            i = self.typed.find("\n", max(0, pt - pos))
+            if i != -1:
+                return pos + i
+        i = self.base.find("\n", max(pos, pt - typed))
+        return self.size() if i == -1 else i + typed
+
+    def line(self, pt):
+        return self._last_newline_before(pt) + 1, self._first_newline_from(pt)
+
+    def substr(self, begin, end):
+        pos, typed = self.pos, len(self.typed)
+        parts = []
+        if begin < pos:
+            parts.append(self.base[begin:min(end, pos)])
+        if begin < pos + typed and end > pos:
+            parts.append(self.typed[max(0, begin - pos):min(end - pos, typed)])
+        if end > pos + typed:
+            parts.append(self.base[max(begin, pos + typed) - typed:end - typed])
+        return "".join(parts)
+
+
+def grid_table(num_rows):
+    table = [["Column 1", "Column 2", "Column 3"]]
+    table += [["row %d" % i, "some text in the middle", str(i * i)] for i in range(num_rows)]
+    return tables.draw_table("", table)
+
+
+def long_list(num_items):
+    return "".join("%d. item number %d\n" % (i + 1, i) for i in range(num_items))
+
+
+# Each case: (name, class, setup(num_lines) -> state, run(state)).
+# Setup is not timed.
+
+def header_tree_setup(n):
+    return make_document(n)
+
+
+def lookups_setup(n):
+    text = make_document(n)
+    rng = random.Random(n)
+    return RstHeaderTree(text), [rng.randrange(len(text)) for _ in range(2000)]
+
+
+def lookups(state):
+    tree, positions = state
+    for pos in positions:
+        header = tree.belong_to(pos)
+        tree.region(header)
+        tree.next(header, same_or_high=True)
+        tree.prev(header, same_or_high=True)
+
+
+def typing_setup(index_class):
+    def setup(n):
+        text = make_document(n)
+        source = TypingSource(text, len(text) // 2)
+        index = index_class()
+        index.rebuild(source)
+        return index, source
+    return setup
+
+
+def typing(state):
+    index, source = state
+    for _ in range(200):
+        at = source.pos + len(source.typed)
+        index.apply_change(at, at, "x")
+        source.type("x")
+        index.flush(source)
+
+
+def footnote_queries_setup(n):
+    index = fu.FootnoteIndex()
+    text = make_document(n)
+    index.rebuild(StringSource(text))
+    index.max_reference_number()  # group the entries by number once
+    rng = random.Random(n)
+    return index, [str(rng.randrange(1, n // 16)) for _ in range(2000)]
+
+
+def footnote_queries(state):
+    index, numbers = state
+    for number in numbers:
+        index.references(number)
+        index.definition(number)
+
+
+def match_lists(text):
+    for line in text.split("\n"):
+        (slu.EMPTY_LIST_PATTERN.match(line) or slu.ROMAN_PATTERN.match(line)
+         or slu.ORDER_LIST_PATTERN.match(line) or slu.UNORDER_LIST_PATTERN.match(line))
+
+
+def smart_list_setup(n):
+    text = long_list(n // 4)
+    view = open_view(text)
+    sublime.run_timeouts()
+    set_cursor(view, text.index("\n"))  # at the end of the first item
+    return view
+
+
+CASES = [
+    ("headers: RstHeaderTree parse", "linear", header_tree_setup, RstHeaderTree),
+    ("headers: HeaderIndex rebuild", "linear", header_tree_setup,
+     lambda text: HeaderIndex().rebuild(StringSource(text))),
+    ("headers: 2000 cursor lookups", "sublinear", lookups_setup, lookups),
+    ("headers: 200 keystrokes, incremental", "sublinear", typing_setup(HeaderIndex), typing),
+    ("footnotes: scan", "linear", header_tree_setup, fu.scan_footnotes),
+    ("footnotes: renumber", "linear", header_tree_setup, fu.renumber_footnotes),
+    ("footnotes: 200 keystrokes, incremental", "sublinear", typing_setup(fu.FootnoteIndex), typing),
+    ("footnotes: 2000 number queries", "sublinear", footnote_queries_setup, footnote_queries),
+    ("tables: grid table parse + draw", "linear",
+     lambda n: grid_table(n // 10),
+     lambda lines: tables.draw_table("", tables.parse_table(lines))),
+    ("lists: match every line", "linear", header_tree_setup, match_lists),
+    ("lists: smart_list renumbering", "linear", smart_list_setup,
+     lambda view: view.run_command("smart_list")),
+]
+
+
+def best_time(setup, run, n):
+    best = None
+    for _ in range(REPEAT):
+        state = setup(n)
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        for view in list(sublime_plugin.views):
+            sublime_plugin.close_view(view)
+    return best
+
+
+def fit_exponent(sizes, times):
+    """least squares slope of log(time) against log(size)"""
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    den = sum((x - mean_x) ** 2 for x in xs)
+    return num / den
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--only", default="", help="only check cases containing this")
+    options = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    print("%-42s %-10s %9s %9s %9s" % ("case", "class", "exponent", "baseline", "limit"))
+    for name, kind, setup, run in CASES:
+        if options.only not in name:
+            continue
+        times = [best_time(setup, run, n) for n in SIZES]
+        exponent = fit_exponent(SIZES, times)
+        limit = LIMITS[kind]
+        results[name] = {"class": kind, "exponent": round(exponent, 3),
+                         "times_ms": {str(n): round(t * 1000, 3) for n, t in zip(SIZES, times)}}
+        previous = baseline.get(name, {}).get("exponent")
+        flag = ""
+        if exponent > limit:
+            failures.append(name)
+            flag = "  FAIL"
+        elif previous is not None and exponent > previous + 0.15:
+            flag = "  (worse than baseline)"
+        print("%-42s %-10s %9.2f %9s %9.2f%s" % (name, kind, exponent,
+                                                 "-" if previous is None else "%.2f" % previous,
+                                                 limit, flag))
+
+    if options.update_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({"sizes": list(SIZES), **{k: v for k, v in sorted(baseline.items()) if k != "sizes"}},
+                      f, indent=2)
+            f.write("\n")
+        print("baseline written to %s" % BASELINE)
+    if failures:
+        print("\nscaling worse than expected: %s" % ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,69 @@
+"""
+Cross-check of the single pass footnote scan (footnotesUtils.scan_footnotes)
+against separate searches for the references and the definitions, as the
+plugin made them before, on random documents and a few known cases, such
+as ``.. [6]_``, a definition marker that is also a reference.
+
+Run from the package root::
+
+    python benchmarks/check_footnotes.py
+
+Exits with status 1 on any mismatch.
+"""
+import random
+import re
+import sys
+
+from harness import load_plugin
+
+load_plugin()
+
+from reStAssured.utils import footnotesUtils as fu  # noqa: E402
+
+KNOWN = [
+    # text, references (begin, end), definitions (begin, end)
+    ("see [6]_ here", [(4, 8)], []),
+    (".. [6] text", [], [(0, 6)]),
+    (".. [6]_", [(3, 7)], [(0, 6)]),
+    ("x\n.. [6]_ and [7]_\n", [(5, 9), (14, 18)], [(2, 8)]),
+    # the marker of a definition does not span lines
+    ("..\n[6] text", [], []),
+    ("..\t[6] text", [], [(0, 6)]),
+]
+
+
+def separate_searches(text):
+    refs = [m.span() for m in re.finditer(fu.REFERENCE_REGEX, text)]
+    defs = [m.span() for m in re.finditer(fu.DEFINITION_REGEX, text, re.MULTILINE)]
+    return refs, defs
+
+
+def scanned(text):
+    refs, defs = fu.scan_footnotes(text)
+    return [ref[:2] for ref in refs], [defn[:2] for defn in defs]
+
+
+def main_():
+    failures = []
+    for text, refs, defs in KNOWN:
+        if scanned(text) != (refs, defs):
+            failures.append("%r: %r, expected %r" % (text, scanned(text), (refs, defs)))
+
+    rng = random.Random(0)
+    pieces = ["[%d]_", ".. [%d] ", ".. [%d]_", "..", " ", "\t", "\n", "[", "]_", "word", "[%d]"]
+    for _ in range(20000):
+        text = "".join(rng.choice(pieces).replace("%d", str(rng.randrange(1, 12)))
+                       for _ in range(rng.randrange(12)))
+        if scanned(text) != separate_searches(text):
+            failures.append("%r: %r, expected %r" % (text, scanned(text), separate_searches(text)))
+
+    for failure in failures[:50]:
+        print(failure)
+    if failures:
+        print("\n%d mismatches" % len(failures))
+        sys.exit(1)
+    print("all footnotes as expected")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,114 @@
+"""
+Regression check of the table commands on grid tables edited by hand:
+each table below is reformatted with ``ctrl+t`` (the table command) on a
+view of the fake API and compared to the table expected.
+
+Run from the package root::
+
+    python benchmarks/check_tables.py
+
+Exits with status 1 on any mismatch.
+"""
+import sys
+
+from harness import load_plugin, open_view, set_cursor, sublime
+
+load_plugin()
+
+CASES = [
+    ("text run past the next column's border, under a narrower header", """\
++---+---+
+| a | b |
++===+===+
+| aaaaaaaaaaaaaaaaaa | xx |
++---+---+
+""", """\
++--------------------+----+
+| a                  | b  |
++====================+====+
+| aaaaaaaaaaaaaaaaaa | xx |
++--------------------+----+
+"""),
+    ("text run past a border in a row of two lines", """\
++---+---+
+| a | b |
++---+---+
+| aaaaaaaaa | xx |
+| q | r |
++---+---+
+""", """\
++-----------+----+
+| a         | b  |
++-----------+----+
+| aaaaaaaaa | xx |
+| q         | r  |
++-----------+----+
+"""),
+    ("row typed below the bottom border", """\
++---+---+
+| a | b |
++===+===+
+| c | d |
++---+---+
+| new | row |
+""", """\
++-----+-----+
+| a   | b   |
++=====+=====+
+| c   | d   |
++-----+-----+
+| new | row |
++-----+-----+
+"""),
+    ("text run past the border of a merged cell, its corner left out below", """\
++---+---+
+| a | b |
++===+===+
+| merged text |
++-------+
+""", """\
++---+---------+
+| a | b       |
++===+=========+
+| merged text |
++---+---------+
+"""),
+    ("merged cell, lined up", """\
++-----+-----+
+| a   | b   |
++=====+=====+
+| c         |
++-----+-----+
+""", """\
++---+---+
+| a | b |
++===+===+
+| c     |
++---+---+
+"""),
+]
+
+
+def reformat(text):
+    view = open_view(text)
+    set_cursor(view, 0)
+    view.run_command("table")
+    sublime.run_timeouts()
+    return view.substr(sublime.Region(0, view.size()))
+
+
+def main_():
+    failures = 0
+    for name, text, expected in CASES:
+        got = reformat(text)
+        if got != expected:
+            failures += 1
+            print("%s:\n%s\nexpected:\n%s" % (name, got, expected))
+    if failures:
+        print("%d mismatches" % failures)
+        sys.exit(1)
+    print("all %d tables as expected" % len(CASES))
+
+
+if __name__ == "__main__":
+    main_()
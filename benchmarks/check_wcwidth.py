@@ -1,4 +1,79 @@
-"""Nonzero_Combining table. Created by setup.py."""
+"""
+Cross-check of the character widths of wcwidth/table_width.py (generated by
+wcwidth/update_tables.py): every code point against the rules of
+update_tables.py applied directly to the unicodedata module, a list of
+characters with a known width, and wcswidth() against the sum of wcwidth().
+
+Run from the package root::
+
+    python benchmarks/check_wcwidth.py
+
+When the table was generated from another Unicode version than that of
+the running Python, only the code points assigned in both are compared,
+and the few whose width changed between versions are listed but don't
+count as mismatches.
+Also reports how many code points changed width from the interval tables
+it replaced (Unicode 7.0, kept below for the comparison and for
+bench_wcwidth.py).
+
+Exits with status 1 on any mismatch.
+"""
+import importlib
+import random
+import sys
+import unicodedata
+
+from harness import load_plugin
+
+load_plugin()
+
+# the module, which the package hides behind its wcwidth function
+wc = importlib.import_module("reStAssured.wcwidth.wcwidth.wcwidth")
+
+# The interval tables of the wcwidth package before table_width.py.
+# Wide_Eastasian table, formerly table_wide.py, created by setup.py.
+# Generated: 2014-11-20T06:55:26.602851
+# Source: EastAsianWidth-7.0.0.txt
+# Date:  2014-02-28, 23:15:00 GMT [KW, LI]
+WIDE_EASTASIAN = (
+    (0x1100, 0x115f,),  # Hangul Choseong Kiyeok  ..Hangul Choseong Filler
+    (0x2329, 0x232a,),  # Left-pointing Angle Brac..Right-pointing Angle Bra
+    (0x2e80, 0x2e99,),  # Cjk Radical Repeat      ..Cjk Radical Rap
+    (0x2e9b, 0x2ef3,),  # Cjk Radical Choke       ..Cjk Radical C-simplified
+    (0x2f00, 0x2fd5,),  # Kangxi Radical One      ..Kangxi Radical Flute
+    (0x2ff0, 0x2ffb,),  # Ideographic Description ..Ideographic Description
+    (0x3000, 0x303e,),  # Ideographic Space       ..Ideographic Variation In
+    (0x3041, 0x3096,),  # Hiragana Letter Small A ..Hiragana Letter Small Ke
+    (0x3099, 0x30ff,),  # Combining Katakana-hirag..Katakana Digraph Koto
+    (0x3105, 0x312d,),  # Bopomofo Letter B       ..Bopomofo Letter Ih
+    (0x3131, 0x318e,),  # Hangul Letter Kiyeok    ..Hangul Letter Araeae
+    (0x3190, 0x31ba,),  # Ideographic Annotation L..Bopomofo Letter Zy
+    (0x31c0, 0x31e3,),  # Cjk Stroke T            ..Cjk Stroke Q
+    (0x31f0, 0x321e,),  # Katakana Letter Small Ku..Parenthesized Korean Cha
+    (0x3220, 0x3247,),  # Parenthesized Ideograph ..Circled Ideograph Koto
+    (0x3250, 0x32fe,),  # Partnership Sign        ..Circled Katakana Wo
+    (0x3300, 0x4dbf,),  # Square Apaato           ..
+    (0x4e00, 0xa48c,),  # Cjk Unified Ideograph-4e..Yi Syllable Yyr
+    (0xa490, 0xa4c6,),  # Yi Radical Qot          ..Yi Radical Ke
+    (0xa960, 0xa97c,),  # Hangul Choseong Tikeut-m..Hangul Choseong Ssangyeo
+    (0xac00, 0xd7a3,),  # Hangul Syllable Ga      ..Hangul Syllable Hih
+    (0xf900, 0xfaff,),  # Cjk Compatibility Ideogr..
+    (0xfe10, 0xfe19,),  # Presentation Form For Ve..Presentation Form For Ve
+    (0xfe30, 0xfe52,),  # Presentation Form For Ve..Small Full Stop
+    (0xfe54, 0xfe66,),  # Small Semicolon         ..Small Equals Sign
+    (0xfe68, 0xfe6b,),  # Small Reverse Solidus   ..Small Commercial At
+    (0xff01, 0xff60,),  # Fullwidth Exclamation Ma..Fullwidth Right White Pa
+    (0xffe0, 0xffe6,),  # Fullwidth Cent Sign     ..Fullwidth Won Sign
+    (0x1b000, 0x1b001,),  # Katakana Letter Archaic ..Hiragana Letter Archaic
+    (0x1f200, 0x1f202,),  # Square Hiragana Hoka    ..Squared Katakana Sa
+    (0x1f210, 0x1f23a,),  # Squared Cjk Unified Ideo..Squared Cjk Unified Ideo
+    (0x1f240, 0x1f248,),  # Tortoise Shell Bracketed..Tortoise Shell Bracketed
+    (0x1f250, 0x1f251,),  # Circled Ideograph Advant..Circled Ideograph Accept
+    (0x20000, 0x2fffd,),  # Cjk Unified Ideograph-20..
+    (0x30000, 0x3fffd,),  # (nil)                   ..
+)
+
+# Nonzero_Combining table, formerly table_comb.py, created by setup.py.
 # Generated: 2014-11-20T06:55:26.612062
 # Source: DerivedCombiningClass-7.0.0.txt
 # Date:  2014-02-07, 18:42:08 GMT [MD]
@@ -154,3 +229,113 @@ NONZERO_COMBINING = (
     (0x1d242, 0x1d244,),  # Combining Greek Musical ..Combining Greek Musical
     (0x1e8d0, 0x1e8d6,),  # (nil)                   ..
 )
+
+
+def bisearch(ucs, table):
+    """1 if the code point ucs lies within one of the (start, end) intervals of table, else 0"""
+    lbound = 0
+    ubound = len(table) - 1
+
+    if ucs < table[0][0] or ucs > table[ubound][1]:
+        return 0
+    while ubound >= lbound:
+        mid = (lbound + ubound) // 2
+        if ucs > table[mid][1]:
+            lbound = mid + 1
+        elif ucs < table[mid][0]:
+            ubound = mid - 1
+        else:
+            return 1
+
+    return 0
+
+KNOWN = [
+    ("a", 1), (" ", 1), ("~", 1), ("\u00e9", 1), ("\u00ad", 1), ("\u03a9", 1),
+    ("\x00", 0), ("\u200b", 0), ("\u034f", 0), ("\u2060", 0),
+    ("\t", -1), ("\n", -1), ("\x7f", -1), ("\x9f", -1), ("\u0301", -1), ("\u20dd", -1),
+    ("\u4e2d", 2), ("\u3042", 2), ("\uac00", 2), ("\uff21", 2), ("\u3000", 2),
+    ("\U00020000", 2), ("\u9fef", 2),
+    # emoji with a default emoji presentation, width 1 in the old tables
+    ("\U0001f600", 2), ("\U0001f389", 2), ("\u231a", 2), ("\u2705", 2),
+]
+
+
+def expected(ucs):
+    """width by the rules of update_tables.py, from the unicodedata module"""
+    char = chr(ucs)
+    if ucs == 0 or ucs == 0x034f or 0x200b <= ucs <= 0x200f or 0x2028 <= ucs <= 0x202e \
+            or 0x2060 <= ucs <= 0x2063:
+        return 0
+    if ucs < 32 or 0x7f <= ucs < 0xa0:
+        return -1
+    if unicodedata.category(char) in ("Mn", "Me") or unicodedata.combining(char):
+        return -1
+    if unicodedata.category(char) == "Cn":
+        # unassigned: wide in the blocks of CJK ideographs only
+        return 2 if 0x3400 <= ucs <= 0x4dbf or 0x4e00 <= ucs <= 0x9fff or 0xf900 <= ucs <= 0xfaff \
+            or 0x20000 <= ucs <= 0x2fffd or 0x30000 <= ucs <= 0x3fffd else 1
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+def legacy(ucs):
+    """width by the interval tables table_width.py replaces"""
+    if ucs == 0 or ucs == 0x034f or 0x200b <= ucs <= 0x200f or 0x2028 <= ucs <= 0x202e \
+            or 0x2060 <= ucs <= 0x2063:
+        return 0
+    if ucs < 32 or 0x7f <= ucs < 0xa0 or bisearch(ucs, NONZERO_COMBINING):
+        return -1
+    return 1 + bisearch(ucs, WIDE_EASTASIAN)
+
+
+def main_():
+    failures = []
+    same_version = wc.UNICODE_VERSION == unicodedata.unidata_version
+    print("table: Unicode %s, unicodedata: Unicode %s" % (wc.UNICODE_VERSION, unicodedata.unidata_version))
+
+    checked = 0
+    changed = 0
+    other_version = []
+    for ucs in range(0x110000):
+        width = wc.wcwidth(chr(ucs))
+        if width != legacy(ucs):
+            changed += 1
+        if not same_version and unicodedata.category(chr(ucs)) == "Cn":
+            continue
+        checked += 1
+        if width != expected(ucs):
+            mismatch = "U+%04X: %d, expected %d" % (ucs, width, expected(ucs))
+            (failures if same_version else other_version).append(mismatch)
+    print("%d code points checked against unicodedata" % checked)
+    if other_version:
+        print("%d of them differ in Unicode %s: %s" % (len(other_version), unicodedata.unidata_version,
+                                                       ", ".join(other_version[:10])))
+    print("%d code points changed width from the Unicode 7.0 interval tables" % changed)
+
+    for char, width in KNOWN:
+        if wc.wcwidth(char) != width:
+            failures.append("%r: %d, expected %d" % (char, wc.wcwidth(char), width))
+
+    rng = random.Random(0)
+    pool = [chr(ucs) for ucs in range(0x250)] + [c for c, _ in KNOWN]
+    for _ in range(20000):
+        text = "".join(rng.choice(pool) for _ in range(rng.randrange(12)))
+        n = rng.choice([None, rng.randrange(12)])
+        widths = [wc.wcwidth(c) for c in text[:n]]
+        if any(w == -1 and not unicodedata.combining(c) and unicodedata.category(c) not in ("Mn", "Me")
+               for c, w in zip(text[:n], widths)):
+            total = -1
+        else:
+            total = sum(max(w, 0) for w in widths)
+        if wc.wcswidth(text, n) != total:
+            failures.append("wcswidth(%r, %r): %d, expected %d" % (text, n, wc.wcswidth(text, n), total))
+
+    for failure in failures[:50]:
+        print(failure)
+    if failures:
+        print("\n%d mismatches" % len(failures))
+        sys.exit(1)
+    print("all widths as expected")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,36 @@
+"""
+Stand-in for the saltydog plugin helpers: the plugin settings are their
+pluginSettingsGovernor defaults (plus overrides set on the instance).
+"""
+import sublime
+
+
+class pluginCentraliser(object):
+    def __init__(self, settingsGovernor, pluginEnv, defaultPluginName=None):
+        self.pluginName = pluginEnv.get("pluginName", defaultPluginName)
+        self.settings = {key: spec["default"]
+                         for key, spec in settingsGovernor["Settings"].items() if "default" in spec}
+
+    def settingsAsDict(self):
+        return dict(self.settings)
+
+    def status_message(self, message):
+        sublime.status_message(message)
+
+    def newProjectHook(self, window):
+        pass
+
+    def newViewHook(self, view):
+        pass
+
+
+def runSafeSubprocess(*args, **kwargs):
+    """
+    main.py imports it but never calls it, so no benchmark gets here;
+    should that change, it fails loudly rather than pretend to have run
+    """
+    raise NotImplementedError("no subprocesses in the benchmarks")
+
+
+def testViewForScopes(view, scopes):
+    return view.syntax().scope in scopes
@@ -0,0 +1,528 @@
+"""
+Headless stand-in for the parts of the sublime API the plugin uses, so its
+commands and listeners can run (and be timed) outside the editor.
+
+Views keep their text in a plain string with a line index patched on edits.
+Edits report to the TextChangeListeners of the buffer like Sublime does,
+and regions added with add_regions follow the edits. Timeouts are queued
+and only run by run_timeouts(), against a virtual clock.
+
+An edit costs O(size) here (the text is a single string), which weighs on
+the timings of the editing commands on the biggest documents. The time
+spent on the editor's own side of the edits (text, line index, selection
+and region bookkeeping) is added up in editor_seconds, so that callers can
+tell it apart from the plugin's.
+"""
+import bisect
+import heapq
+import itertools
+import re
+import time
+
+import sublime_plugin
+
+HIDDEN = 128
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+LITERAL = 1
+IGNORECASE = 2
+KIND_SNIPPET = (5, 's', 'Snippet')
+RST_SYNTAX = "Packages/RestructuredText/reStructuredText.sublime-syntax"
+
+
+editor_seconds = [0.0]
+
+
+def version():
+    return "4169"
+
+
+class Region(object):
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a, b=None, xpos=-1):
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def __len__(self):
+        return self.size()
+
+    def empty(self):
+        return self.a == self.b
+
+    def contains(self, x):
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def intersects(self, other):
+        return self.begin() < other.end() and other.begin() < self.end()
+
+    def cover(self, other):
+        return Region(min(self.begin(), other.begin()), max(self.end(), other.end()))
+
+    def to_tuple(self):
+        return (self.a, self.b)
+
+    def __iter__(self):
+        return iter((self.a, self.b))
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and (self.a, self.b) == (other.a, other.b)
+
+    def __hash__(self):
+        return hash((self.a, self.b))
+
+    def __repr__(self):
+        return "(%d, %d)" % (self.a, self.b)
+
+
+class Selection(object):
+    def __init__(self):
+        self.regions = [Region(0)]
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __getitem__(self, i):
+        return self.regions[i]
+
+    def __iter__(self):
+        return iter(list(self.regions))
+
+    def clear(self):
+        self.regions = []
+
+    def add(self, region):
+        if not isinstance(region, Region):
+            region = Region(region)
+        self.regions.append(region)
+        self.regions.sort(key=Region.begin)
+
+    def add_all(self, regions):
+        for region in regions:
+            self.add(region)
+
+    def subtract(self, region):
+        self.regions = [r for r in self.regions if r != region]
+
+    def _shift(self, begin, end, delta):
+        if begin == end:
+            # like the caret, selections at an insertion point end up after it
+            begin -= 1
+        self.regions = [Region(_moved(r.a, begin, end, delta), _moved(r.b, begin, end, delta))
+                        for r in self.regions]
+
+
+def _moved(pt, begin, end, delta):
+    """where pt goes when [begin, end) is replaced by end - begin + delta characters"""
+    if pt <= begin:
+        return pt
+    if pt >= end:
+        return pt + delta
+    # inside the replaced text: to the end of the new one
+    return end + delta
+
+
+class Syntax(object):
+    def __init__(self, path, scope):
+        self.path = path
+        self.scope = scope
+        self.name = path.rsplit("/", 1)[-1].split(".")[0]
+
+
+def syntax_from_path(path):
+    if path == RST_SYNTAX:
+        return Syntax(path, "text.restructuredtext")
+    return Syntax(path, "text.plain")
+
+
+class Settings(dict):
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+    def erase(self, key):
+        self.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        pass
+
+    def clear_on_change(self, tag):
+        pass
+
+
+class Edit(object):
+    def __init__(self, view):
+        self.view = view
+
+
+class HistoricPosition(object):
+    __slots__ = ("pt",)
+
+    def __init__(self, pt):
+        self.pt = pt
+
+
+class TextChange(object):
+    __slots__ = ("a", "b", "str", "len_utf16", "len_utf8")
+
+    def __init__(self, a, b, text):
+        self.a = HistoricPosition(a)
+        self.b = HistoricPosition(b)
+        self.str = text
+        self.len_utf16 = self.len_utf8 = len(text)
+
+
+class Buffer(object):
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.buffer_id = next(Buffer._ids)
+        self.views_ = []
+        self.text_listeners = []
+
+    def id(self):
+        return self.buffer_id
+
+    def views(self):
+        return list(self.views_)
+
+    def primary_view(self):
+        return self.views_[0] if self.views_ else None
+
+
+class View(object):
+    _ids = itertools.count(1)
+    visible_lines = 60
+
+    def __init__(self, text="", syntax=RST_SYNTAX, buffer=None):
+        self.view_id = next(View._ids)
+        self.buffer_ = buffer or Buffer()
+        self.buffer_.views_.append(self)
+        self.text = text
+        self._line_starts = None
+        self._change_count = 0
+        self._sel = Selection()
+        self._settings = Settings(syntax=syntax, tab_size=4)
+        self._regions = {}
+        self._folds = []
+        self._status = {}
+        self._top = 0
+        self.window_ = None
+        self.closed = False
+        sublime_plugin.attach_view(self)
+
+    # identity and state
+
+    def id(self):
+        return self.view_id
+
+    def buffer_id(self):
+        return self.buffer_.id()
+
+    def buffer(self):
+        return self.buffer_
+
+    def is_valid(self):
+        return not self.closed
+
+    def change_count(self):
+        return self._change_count
+
+    def settings(self):
+        return self._settings
+
+    def syntax(self):
+        return syntax_from_path(self._settings.get("syntax"))
+
+    def assign_syntax(self, path):
+        self._settings["syntax"] = path
+        sublime_plugin.attach_view(self)
+
+    def window(self):
+        return self.window_
+
+    def score_selector(self, pt, selector):
+        return 1 if self.syntax().scope in selector else 0
+
+    def match_selector(self, pt, selector):
+        return self.score_selector(pt, selector) > 0
+
+    def set_status(self, key, value):
+        self._status[key] = value
+
+    def erase_status(self, key):
+        self._status.pop(key, None)
+
+    def get_status(self, key):
+        return self._status.get(key, "")
+
+    # text
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, x):
+        if isinstance(x, Region):
+            return self.text[x.begin():x.end()]
+        return self.text[x:x + 1]
+
+    def _starts(self):
+        if self._line_starts is None:
+            starts = [0]
+            find = self.text.find
+            pos = find("\n")
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = find("\n", pos + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def rowcol(self, pt):
+        starts = self._starts()
+        row = bisect.bisect_right(starts, max(0, min(pt, len(self.text)))) - 1
+        return row, pt - starts[row]
+
+    def text_point(self, row, col):
+        starts = self._starts()
+        row = max(0, min(row, len(starts) - 1))
+        return min(starts[row] + col, len(self.text))
+
+    def line(self, x):
+        if isinstance(x, Region):
+            begin = self.line(x.begin()).begin()
+            return Region(begin, self.line(x.end()).end())
+        starts = self._starts()
+        pt = max(0, min(x, len(self.text)))
+        row = bisect.bisect_right(starts, pt) - 1
+        end = starts[row + 1] - 1 if row + 1 < len(starts) else len(self.text)
+        return Region(starts[row], end)
+
+    def full_line(self, x):
+        region = self.line(x)
+        return Region(region.begin(), min(region.end() + 1, len(self.text)))
+
+    def lines(self, region):
+        result = []
+        pt = region.begin()
+        while True:
+            line = self.line(pt)
+            result.append(line)
+            pt = line.end() + 1
+            if pt >= region.end() or pt > len(self.text):
+                return result
+
+    def split_by_newlines(self, region):
+        return self.lines(region)
+
+    def find(self, pattern, start_pt, flags=0):
+        regex = re.compile(re.escape(pattern) if flags & LITERAL else pattern,
+                           re.MULTILINE | (re.IGNORECASE if flags & IGNORECASE else 0))
+        m = regex.search(self.text, start_pt)
+        return Region(m.start(), m.end()) if m else Region(-1, -1)
+
+    def find_all(self, pattern, flags=0, fmt=None, extractions=None):
+        regex = re.compile(re.escape(pattern) if flags & LITERAL else pattern,
+                           re.MULTILINE | (re.IGNORECASE if flags & IGNORECASE else 0))
+        regions = []
+        for m in regex.finditer(self.text):
+            regions.append(Region(m.start(), m.end()))
+            if fmt is not None and extractions is not None:
+                extractions.append(m.expand(fmt))
+        return regions
+
+    # edits
+
+    def _replace(self, begin, end, text):
+        start = time.perf_counter()
+        begin, end = max(0, begin), min(end, len(self.text))
+        self.text = self.text[:begin] + text + self.text[end:]
+        delta = len(text) - (end - begin)
+        starts = self._line_starts
+        if starts is not None:
+            # patch the line index rather than rescanning the whole text
+            first = bisect.bisect_right(starts, begin)
+            last = bisect.bisect_right(starts, end)
+            new = [begin + m.end() for m in re.finditer("\n", text)]
+            starts[first:] = new + [s + delta for s in starts[last:]]
+        self._change_count += 1
+        for view in self.buffer_.views_:
+            view._sel._shift(begin, end, delta)
+            for key, (regions, flags) in view._regions.items():
+                view._regions[key] = ([Region(_moved(r.a, begin, end, delta), _moved(r.b, begin, end, delta))
+                                       for r in regions], flags)
+            view._folds = [Region(_moved(r.a, begin, end, delta), _moved(r.b, begin, end, delta))
+                           for r in view._folds if not (begin < r.end() and r.begin() < end)]
+            view._change_count = self._change_count
+        editor_seconds[0] += time.perf_counter() - start
+        sublime_plugin.text_changed(self.buffer_, [TextChange(begin, end, text)])
+        return len(text)
+
+    def insert(self, edit, pt, text):
+        return self._replace(pt, pt, text)
+
+    def erase(self, edit, region):
+        self._replace(region.begin(), region.end(), "")
+
+    def replace(self, edit, region, text):
+        self._replace(region.begin(), region.end(), text)
+
+    def run_command(self, name, args=None):
+        sublime_plugin.run_view_command(self, name, args or {})
+
+    # selection, regions, folding and viewport
+
+    def sel(self):
+        return self._sel
+
+    def add_regions(self, key, regions, scope="", icon="", flags=0):
+        self._regions[key] = (list(regions), flags)
+
+    def get_regions(self, key):
+        return list(self._regions.get(key, ((), 0))[0])
+
+    def erase_regions(self, key):
+        self._regions.pop(key, None)
+
+    def fold(self, x):
+        regions = x if isinstance(x, list) else [x]
+        new = [r for r in regions if not any(f.contains(r) for f in self._folds)]
+        self._folds.extend(new)
+        return bool(new)
+
+    def unfold(self, x):
+        regions = x if isinstance(x, list) else [x]
+        unfolded = [f for f in self._folds if any(f.intersects(r) or f == r for r in regions)]
+        self._folds = [f for f in self._folds if f not in unfolded]
+        return unfolded
+
+    def unfold_all(self):
+        self._folds = []
+
+    def is_folded(self, region):
+        return any(f.contains(region) for f in self._folds)
+
+    def folded_regions(self):
+        return list(self._folds)
+
+    def visible_region(self):
+        row = self.rowcol(self._top)[0]
+        return Region(self.text_point(row, 0), self.line(self.text_point(row + self.visible_lines, 0)).end())
+
+    def show(self, x, show_surrounds=True, keep_to_left=False, animate=True):
+        pt = x.begin() if isinstance(x, Region) else x
+        visible = self.visible_region()
+        if not visible.begin() <= pt <= visible.end():
+            row = self.rowcol(pt)[0]
+            self._top = self.text_point(max(0, row - self.visible_lines // 2), 0)
+
+    def show_at_center(self, x):
+        self.show(x)
+
+
+class Window(object):
+    def __init__(self):
+        self.panels = {}
+        self.views_ = []
+
+    def create_output_panel(self, name):
+        panel = self.panels[name] = View(syntax="Packages/Text/Plain text.tmLanguage")
+        return panel
+
+    def run_command(self, name, args=None):
+        pass
+
+    def active_view(self):
+        return self.views_[-1] if self.views_ else None
+
+    def views(self):
+        return list(self.views_)
+
+
+_window = Window()
+
+
+def active_window():
+    return _window
+
+
+# timeouts, run against a virtual clock by run_timeouts()
+
+_timeouts = []
+_sequence = itertools.count()
+_now = [0.0]
+
+
+def set_timeout(callback, delay=0):
+    heapq.heappush(_timeouts, (_now[0] + delay, next(_sequence), callback))
+
+
+def set_timeout_async(callback, delay=0):
+    set_timeout(callback, delay)
+
+
+def run_timeouts(ms=None):
+    """run the timeouts due within ms (all of them if None), in order"""
+    until = None if ms is None else _now[0] + ms
+    while _timeouts and (until is None or _timeouts[0][0] <= until):
+        when, _, callback = heapq.heappop(_timeouts)
+        _now[0] = max(_now[0], when)
+        callback()
+    if until is not None:
+        _now[0] = until
+
+
+messages = []
+
+
+def status_message(message):
+    messages.append(message)
+
+
+def message_dialog(message):
+    messages.append(message)
+
+
+def error_message(message):
+    messages.append(message)
+
+
+def load_settings(name):
+    return Settings()
+
+
+def save_settings(name):
+    pass
+
+
+def load_resource(name):
+    return ""
+
+
+def find_resources(pattern):
+    return []
+
+
+def packages_path():
+    return ""
+
+
+class QuickPanelItem(object):
+    def __init__(self, trigger, details="", annotation="", kind=None):
+        self.trigger = trigger
+        self.details = details
+        self.annotation = annotation
+        self.kind = kind
@@ -0,0 +1,181 @@
+"""
+Headless stand-in for sublime_plugin: the base classes, plus the plumbing
+Sublime does behind them (command lookup by name, listener attachment and
+event dispatch), driven by the fake sublime module.
+
+register(module) collects the commands and listeners of a plugin module,
+like Sublime does when it loads the module.
+"""
+import re
+
+import sublime
+
+
+class Command(object):
+    def is_enabled(self, *args, **kwargs):
+        return True
+
+    def is_visible(self, *args, **kwargs):
+        return True
+
+    def name(self):
+        return command_name(type(self))
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window):
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view):
+        self.view = view
+
+
+class EventListener(object):
+    pass
+
+
+class ViewEventListener(object):
+    @classmethod
+    def is_applicable(cls, settings):
+        return True
+
+    @classmethod
+    def applies_to_primary_view_only(cls):
+        return True
+
+    def __init__(self, view):
+        self.view = view
+
+
+class TextChangeListener(object):
+    @classmethod
+    def is_applicable(cls, buffer):
+        return True
+
+    def __init__(self):
+        self.buffer = None
+
+    def attach(self, buffer):
+        self.buffer = buffer
+        buffer.text_listeners.append(self)
+
+    def detach(self):
+        self.buffer.text_listeners.remove(self)
+        self.buffer = None
+
+    def is_attached(self):
+        return self.buffer is not None
+
+
+commands = {}            # command name -> TextCommand (or WindowCommand) subclass
+event_listeners = []     # EventListener instances
+view_listener_classes = []
+text_listener_classes = []
+views = []
+
+
+def command_name(cls):
+    name = cls.__name__
+    if name.endswith("Command"):
+        name = name[:-len("Command")]
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def register(module):
+    """pick up the commands and listeners defined in a plugin module"""
+    for cls in list(vars(module).values()):
+        if not isinstance(cls, type) or cls.__module__ != module.__name__:
+            continue
+        if issubclass(cls, (TextCommand, WindowCommand)):
+            commands[command_name(cls)] = cls
+        elif issubclass(cls, EventListener):
+            event_listeners.append(cls())
+        elif issubclass(cls, ViewEventListener):
+            view_listener_classes.append(cls)
+        elif issubclass(cls, TextChangeListener):
+            text_listener_classes.append(cls)
+    for view in views:
+        attach_view(view)
+
+
+def attach_view(view):
+    """(re)attach the applicable listeners to a view, as on load or syntax change"""
+    if view not in views:
+        views.append(view)
+    view.view_listeners = [cls(view) for cls in view_listener_classes
+                           if cls.is_applicable(view.settings())]
+    for listener in list(view.buffer_.text_listeners):
+        if not listener.is_applicable(view.buffer_):
+            listener.detach()
+    attached = {type(listener) for listener in view.buffer_.text_listeners}
+    for cls in text_listener_classes:
+        if cls not in attached and cls.is_applicable(view.buffer_):
+            cls().attach(view.buffer_)
+
+
+def dispatch(view, event, *args):
+    """call on_<event> of the listeners of a view"""
+    method = "on_" + event
+    for listener in event_listeners:
+        callback = getattr(listener, method, None)
+        if callback is not None:
+            callback(view, *args)
+    for listener in getattr(view, "view_listeners", ()):
+        callback = getattr(listener, method, None)
+        if callback is not None:
+            callback(*args)
+
+
+def text_changed(buffer, changes):
+    for listener in list(buffer.text_listeners):
+        callback = getattr(listener, "on_text_changed", None)
+        if callback is not None:
+            callback(changes)
+
+
+def run_builtin_command(view, name, args):
+    """the few built-in commands the plugin (and the benchmarks) rely on"""
+    if name == "insert_snippet":
+        contents = re.sub(r"\$\{\d+:([^}]*)\}|\$\d+", r"\1", args.get("contents", ""))
+        for region in view.sel():
+            view.insert(None, region.begin(), contents)
+    elif name == "insert":
+        for region in view.sel():
+            view.replace(None, region, args.get("characters", ""))
+    elif name == "append":
+        view.insert(None, view.size(), args.get("characters", ""))
+
+
+def run_view_command(view, name, args):
+    cls = commands.get(name)
+    before = view.change_count()
+    selection = [r.to_tuple() for r in view.sel()]
+    if cls is None:
+        run_builtin_command(view, name, args)
+    else:
+        command = cls(view)
+        try:
+            enabled = command.is_enabled(**args)
+        except TypeError:
+            # like Sublime, fall back on calling it without the arguments
+            enabled = command.is_enabled()
+        if enabled:
+            command.run(sublime.Edit(view), **args)
+    if view.change_count() != before:
+        dispatch(view, "modified")
+    if [r.to_tuple() for r in view.sel()] != selection:
+        dispatch(view, "selection_modified")
+
+
+def close_view(view):
+    view.buffer_.views_.remove(view)
+    view.closed = True
+    dispatch(view, "close")
+    if view in views:
+        views.remove(view)
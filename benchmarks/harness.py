@@ -0,0 +1,129 @@
+"""
+Shared plumbing of the headless benchmarks: loading the plugin against the
+fake sublime API (benchmarks/fakes), generating reSt documents of a given
+number of lines, and measuring time and peak memory of an operation.
+"""
+import gc
+import importlib
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+PACKAGE = "reStAssured"
+
+sys.path.insert(0, os.path.join(BENCH_DIR, "fakes"))
+import sublime  # noqa: E402
+import sublime_plugin  # noqa: E402
+
+
+def load_plugin():
+    """import the plugin modules as Sublime would and return (main, tables)"""
+    if PACKAGE + ".main" in sys.modules:
+        return sys.modules[PACKAGE + ".main"], sys.modules[PACKAGE + ".tables"]
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [ROOT]
+    sys.modules[PACKAGE] = package
+    # main first: on import it clears the other modules of the package
+    main = importlib.import_module(PACKAGE + ".main")
+    tables = importlib.import_module(PACKAGE + ".tables")
+    for module in (main, tables):
+        sublime_plugin.register(module)
+    main.plugin_loaded()
+    sublime.run_timeouts()
+    return main, tables
+
+
+class StringSource(object):
+    """the text source interface of HeaderIndex/FootnoteIndex over a string"""
+
+    def __init__(self, text):
+        self.text = text
+
+    def size(self):
+        return len(self.text)
+
+    def line(self, pt):
+        begin = self.text.rfind("\n", 0, pt) + 1
+        end = self.text.find("\n", pt)
+        return begin, len(self.text) if end == -1 else end
+
+    def substr(self, begin, end):
+        return self.text[begin:end]
+
+
+ADORNMENTS = ("=", "-", "~")
+
+BLOCK = """\
+Section {n}
+{underline}
+
+Some prose for section {n}, with a footnote reference [{n}]_ in the middle
+of a line long enough to look like a real paragraph of documentation.
+
+- a bullet item
+- another bullet item
+
+1. an ordered item
+2. another ordered item
+
+.. [{n}] The footnote of section {n}.
+
+"""
+BLOCK_LINES = BLOCK.count("\n")
+
+
+def make_document(num_lines):
+    """a reSt document of about num_lines lines: sections, lists and footnotes"""
+    parts = []
+    for n in range(1, max(1, num_lines // BLOCK_LINES) + 1):
+        title = "Section %d" % n
+        parts.append(BLOCK.format(n=n, underline=ADORNMENTS[n % 3] * len(title)))
+    return "".join(parts)
+
+
+def make_table(num_rows):
+    """a two-space separated table outline, for the table commands"""
+    rows = ["Column 1  Column 2  Column 3"]
+    for i in range(num_rows):
+        rows.append("row %d  some text in the middle  %d" % (i, i * i))
+    return "\n".join(rows) + "\n"
+
+
+def open_view(text):
+    view = sublime.View(text)
+    sublime_plugin.dispatch(view, "load")
+    sublime_plugin.dispatch(view, "activated")
+    return view
+
+
+def set_cursor(view, pt):
+    view.sel().clear()
+    view.sel().add(sublime.Region(pt))
+
+
+def measure(operation, setup=None, memory=True):
+    """
+    (seconds, peak bytes allocated or None) of one operation(state), where
+    state is what setup() returns (fresh for each run, and not measured)
+    """
+    def run(trace):
+        state = setup() if setup is not None else None
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        operation(state)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+        if trace:
+            tracemalloc.stop()
+        return elapsed, peak
+
+    elapsed = run(False)[0]
+    # a second run for the memory, as tracing allocations slows everything down
+    peak = run(True)[1] if memory else None
+    return elapsed, peak
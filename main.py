@@ -1,12 +1,16 @@
-import sublime, sublime_plugin, re, os, sys, string
-from collections import namedtuple
+import sublime, sublime_plugin, re, os, sys, string, bisect
 import json
 import xml.etree.ElementTree as ET
 
 
 from .utils.constants import pluginEnv, pluginSettingsGovernor
 from .utils import footnotesUtils as fu
+from .utils.footnotesUtils import FootnoteIndex
 from .utils import listsUtils as slu
+from .utils.headersUtils import RstHeaderTree, HeaderIndex
+from .utils.cacheUtils import LRUCache
+from .utils.schedulerUtils import BufferScheduler
+from .utils.instrumentUtils import Instrumentation
 from .utils.textcommandUtils import BaseBlockCommand
 
 #saltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTARTsaltydogSTART
@@ -43,6 +47,17 @@ if int(sublime.version()) >= 3114:
         global pluginCentral
         pluginCentral = pluginCentraliser(pluginSettingsGovernor, pluginEnv, defaultPluginName=__package__)
         # print(f'{pluginCentral.pluginName} settings initialised')
+        HeaderIndexUpdater.indexes.resize(plugin_setting("headerCacheMaxBuffers", 32),
+                                          plugin_setting("headerCacheMaxHeaders", 250000))
+        HeaderIndexUpdater.async_min_size = plugin_setting("headerAsyncParseMinSize", 1000000)
+        LargeFileMode.min_size = plugin_setting("largeFileMinSize", 5000000)
+        LargeFileMode.min_lines = plugin_setting("largeFileMinLines", 100000)
+        scheduler.budget = plugin_setting("schedulerTickBudget", 8)
+        scheduler.jobs["footnote-regions"].delay = plugin_setting("footnoteUpdateDelay", 300)
+        FootnoteRegionsUpdater.viewport_min_size = plugin_setting("footnoteViewportMinSize", 1000000)
+        FootnoteRegionsUpdater.viewport_margin = plugin_setting("footnoteViewportMargin", 10000)
+        # once the other plugin modules (tables) are loaded too
+        sublime.set_timeout(lambda: apply_instrumentation(plugin_setting("instrumentation", False)), 0)
         
     def plugin_unloaded():
         """
@@ -52,6 +67,7 @@ if int(sublime.version()) >= 3114:
         Exit threads.
         """
         # print(f'{pluginEnv["pluginName"]} unloaded')
+        instrumentation.disable()
 
 else:
     raise ImportWarning(f"The {pluginEnv.get('pluginName', __package__)} plugin doesn't work with Sublime Text versions prior to 3114")
@@ -60,12 +76,203 @@ class SaltyDogDynamicProjectSettingsUpdater(sublime_plugin.EventListener):
     def on_load_project(self, window):
         if pluginCentral is not None:
             pluginCentral.newProjectHook(window)
-    def on_activated(self, view):
+
+class SaltyDogDynamicViewSettingsUpdater(sublime_plugin.ViewEventListener):
+    @classmethod
+    def is_applicable(cls, settings):
+        return is_rst_syntax(settings)
+
+    def on_activated(self):
         if pluginCentral is not None:
-            pluginCentral.newViewHook(view)
+            pluginCentral.newViewHook(self.view)
+
+def plugin_setting(key, default=None):
+    """
+    Read one of the plugin settings (see pluginSettingsGovernor),
+    falling back to default while the plugin is still loading
+    """
+    if pluginCentral is None:
+        return default
+    return pluginCentral.settingsAsDict().get(key, default)
 
 #saltydogENDsaltydogENDsaltydogENDsaltydogENDsaltydogENDsaltydogENDsaltydogENDsaltydogENDsaltydogEND
 
+RST_SCOPE = "text.restructuredtext"
+
+def is_rst_syntax(settings):
+    """
+    Tell from its settings whether a view is in reSt syntax, for the
+    is_applicable of the view and text change listeners: Sublime attaches
+    them only to reSt views (and buffers), and re-attaches or drops them
+    when the syntax changes. The plain EventListeners (the cache eviction
+    on close) are still called for every view.
+    """
+    path = settings.get("syntax")
+    if not path:
+        return False
+    syntax = sublime.syntax_from_path(path)
+    return syntax is not None and syntax.scope == RST_SCOPE
+
+
+def closes_buffer(view):
+    """for on_close: whether no other view (clone) of the buffer of view is left"""
+    return all(other.id() == view.id() for other in view.buffer().views())
+
+
+def is_rst_buffer(buffer):
+    """is_rst_syntax for the text change listeners, from the primary view of the buffer"""
+    view = buffer.primary_view()
+    return view is not None and is_rst_syntax(view.settings())
+
+
+class ViewTextSource(object):
+    """
+    Adapts a view to the plain (begin, end) text source used by
+    HeaderIndex and FootnoteIndex
+    """
+    def __init__(self, view):
+        self.view = view
+
+    def size(self):
+        return self.view.size()
+
+    def line(self, pt):
+        region = self.view.line(pt)
+        return region.begin(), region.end()
+
+    def substr(self, begin, end):
+        return self.view.substr(sublime.Region(begin, end))
+
+
+def replace_in_one_go(view, edit, edits, text=None):
+    """
+    Apply (begin, end, new_text) edits, sorted and not overlapping, as a
+    single replace from the first to the last (so the indexes see one
+    change), keeping the cursors where they were relative to the text
+    around them. text is that of the whole view, if at hand.
+    """
+    begin, end = edits[0][0], min(edits[-1][1], view.size())
+    if text is None:
+        text, offset = view.substr(sublime.Region(begin, end)), begin
+    else:
+        offset = 0
+    pieces = []
+    pos = begin
+    for e_begin, e_end, new_text in edits:
+        pieces.append(text[pos - offset:e_begin - offset])
+        pieces.append(new_text)
+        pos = e_end
+
+    starts = [e[0] for e in edits]
+    shifts = [0]
+    for e_begin, e_end, new_text in edits:
+        shifts.append(shifts[-1] + len(new_text) - (e_end - e_begin))
+    def moved(pt):
+        i = bisect.bisect_right(starts, pt)
+        if i and pt < edits[i - 1][1]:
+            return edits[i - 1][0] + shifts[i - 1]
+        return pt + shifts[i]
+    cursors = [(moved(r.a), moved(r.b)) for r in view.sel()]
+
+    view.replace(edit, sublime.Region(begin, end), ''.join(pieces))
+    view.sel().clear()
+    view.sel().add_all([sublime.Region(a, b) for a, b in cursors])
+
+
+# the deferred per-buffer work of all features goes through here
+# (see BufferScheduler); features register their jobs next to their code
+scheduler = BufferScheduler(sublime.set_timeout, sublime.set_timeout_async)
+
+# opt-in timing of the commands and listeners, see apply_instrumentation
+instrumentation = Instrumentation()
+
+def apply_instrumentation(enabled):
+    """
+    Wrap (or unwrap) the commands and listeners of main.py and tables.py,
+    and the scheduler jobs, for timing. Samples are also appended to the
+    instrumentationSamplesFile JSONL file, if that setting is set.
+    """
+    if not enabled:
+        instrumentation.disable()
+        return
+    modules = [sys.modules.get(__name__), sys.modules.get(__package__ + ".tables")]
+    instrumentation.enable([m for m in modules if m is not None],
+                           sublime_plugin.TextCommand,
+                           (sublime_plugin.EventListener, sublime_plugin.ViewEventListener,
+                            sublime_plugin.TextChangeListener),
+                           jobs=scheduler.jobs.values(),
+                           samples_path=plugin_setting("instrumentationSamplesFile", "") or None)
+
+
+class InstrumentationToggleCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        apply_instrumentation(not instrumentation.enabled)
+        pluginCentral.status_message('Timing of reStAssured commands is %s'
+                                     % ('on' if instrumentation.enabled else 'off'))
+
+
+class InstrumentationReportCommand(sublime_plugin.WindowCommand):
+    """
+    Show the call counts and p50/p95/p99 latencies recorded so far
+    in an output panel
+    """
+    def run(self):
+        panel = self.window.create_output_panel("reStAssured_timings")
+        panel.run_command("append", {"characters": instrumentation.report() + "\n"})
+        self.window.run_command("show_panel", {"panel": "output.reStAssured_timings"})
+
+
+class InstrumentationResetCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        instrumentation.reset()
+
+
+class LargeFileMode(sublime_plugin.ViewEventListener):
+    """
+    Flags reSt views over the largeFileMinSize (characters) or
+    largeFileMinLines thresholds, and shows it in the status bar.
+    In large file mode the plugin degrades gracefully:
+    - footnotes are only marked around the screen, and only once typing pauses
+    - header trees are always (re)built in the background
+    - the full footnote and header indexes are only built on demand
+    """
+    min_size = 5000000
+    min_lines = 100000
+    status_key = "reStAssuredLargeFile"
+    active = {}  # view id -> whether the view is in large file mode
+
+    @classmethod
+    def is_applicable(cls, settings):
+        return is_rst_syntax(settings)
+
+    @classmethod
+    def check(cls, view):
+        """(re)evaluate the thresholds for the view and update its status"""
+        size = view.size()
+        large = size >= cls.min_size or view.rowcol(size)[0] + 1 >= cls.min_lines
+        if cls.active.get(view.id()) != large:
+            cls.active[view.id()] = large
+            if large:
+                view.set_status(cls.status_key, "reSt: large file mode")
+            else:
+                view.erase_status(cls.status_key)
+        return large
+
+    @classmethod
+    def is_large(cls, view):
+        large = cls.active.get(view.id())
+        return cls.check(view) if large is None else large
+
+    def on_load(self):
+        LargeFileMode.check(self.view)
+
+    def on_activated(self):
+        LargeFileMode.check(self.view)
+
+    def on_modified(self):
+        LargeFileMode.check(self.view)
+
+
 # class InsertMySnippetStrCommand(sublime_plugin.TextCommand):
 #     snippetStr = ""
 
@@ -233,30 +440,185 @@ class ConvertTextToRefLabelCommand(sublime_plugin.TextCommand):
 
 #footnotesSTARTfootnotesSTARTfootnotesSTARTfootnotesSTARTfootnotesSTARTfootnotesSTARTfootnotesSTART
 
-class Footnotes(sublime_plugin.EventListener):
-    def update_footnote_data(self, view):
-        view.add_regions(fu.REFERENCE_KEY,
-                         view.find_all(fu.REFERENCE_REGEX),
-                         '', 'cross',
-                         )
-        view.add_regions(fu.DEFINITION_KEY,
-                         view.find_all(fu.DEFINITION_REGEX),
-                         '',
-                         'cross',
-                         )
+class FootnoteIndexUpdater(sublime_plugin.TextChangeListener):
+    """
+    Keeps the footnote index of a buffer in step with its edits, without
+    reading any text: the edited lines are rescanned on the next update.
+    """
+    indexes = {}   # buffer id -> FootnoteIndex
+
+    @classmethod
+    def is_applicable(cls, buffer):
+        return is_rst_buffer(buffer)
+
+    def on_text_changed(self, changes):
+        index = FootnoteIndexUpdater.indexes.get(self.buffer.id())
+        if index is None:
+            return
+        for change in changes:
+            index.apply_change(change.a.pt, change.b.pt, change.str)
+        view = self.buffer.primary_view()
+        index.change_count = view.change_count() if view is not None else None
+
+    def on_reload(self):
+        FootnoteIndexUpdater.indexes.pop(self.buffer.id(), None)
+
+    def on_revert(self):
+        FootnoteIndexUpdater.indexes.pop(self.buffer.id(), None)
+
+
+def get_footnote_index(view):
+    """
+    Return the up to date FootnoteIndex of the view, rescanning only the
+    lines edited since the last call (or everything, the first time).
+    """
+    source = ViewTextSource(view)
+    index = FootnoteIndexUpdater.indexes.get(view.buffer_id())
+    if (index is None or index.change_count != view.change_count()
+            or index.size != view.size()):
+        index = FootnoteIndex()
+        index.rebuild(source, view.change_count())
+        FootnoteIndexUpdater.indexes[view.buffer_id()] = index
+    else:
+        index.flush(source)
+    return index
+
+
+class FootnoteRegionsUpdater(sublime_plugin.ViewEventListener):
+    """
+    Marks footnote references and definitions of reSt views with hidden
+    regions, for the footnote commands to use. Only attached to reSt views.
+    Bursts of edits are coalesced by the scheduler: the update only runs
+    once the view has been idle for footnoteUpdateDelay milliseconds, and
+    not at all if the
+    buffer is unchanged since the previous one. The update itself only
+    rescans the edited lines, and only resets the regions if a footnote was
+    actually added, removed or altered (the regions move along with the
+    text by themselves).
+
+    Buffers over footnoteViewportMinSize characters are only marked around
+    what is on screen (give or take footnoteViewportMargin characters), the
+    marked span growing as the cursor moves through the document, though
+    not while typing, which is left to the update. Their full
+    footnote index is only built once a footnote command needs it.
+    """
+    viewport_min_size = 1000000
+    viewport_margin = 10000
+    scanned = {}     # view id -> change_count at the last update
+    published = {}   # view id -> (index, index version) behind its regions
+    viewports = {}   # view id -> (change_count, begin, end, refs, defs) marked so far
+
+    @classmethod
+    def is_applicable(cls, settings):
+        return is_rst_syntax(settings)
+
+    @classmethod
+    def in_viewport_mode(cls, view):
+        if LargeFileMode.is_large(view):
+            return True
+        return (view.size() >= cls.viewport_min_size
+                and FootnoteIndexUpdater.indexes.get(view.buffer_id()) is None)
+
+    @classmethod
+    def mark_viewport(cls, view):
+        """scan and mark the lines on (and around) the screen not marked yet"""
+        vid = view.id()
+        change_count = view.change_count()
+        visible = view.visible_region()
+        begin = view.line(max(0, visible.begin() - cls.viewport_margin)).begin()
+        end = view.line(min(view.size(), visible.end() + cls.viewport_margin)).end()
+
+        marked = cls.viewports.get(vid)
+        if marked is not None and marked[0] == change_count and marked[1] <= end and begin <= marked[2]:
+            # overlapping what is already marked: just scan the new margins
+            _, marked_begin, marked_end, refs, defs = marked
+            if marked_begin <= begin and end <= marked_end:
+                return
+            before = fu.scan_footnotes(view.substr(sublime.Region(begin, marked_begin)), begin) \
+                if begin < marked_begin else ([], [])
+            after = fu.scan_footnotes(view.substr(sublime.Region(marked_end, end)), marked_end) \
+                if marked_end < end else ([], [])
+            refs = before[0] + refs + after[0]
+            defs = before[1] + defs + after[1]
+            begin, end = min(begin, marked_begin), max(end, marked_end)
+        else:
+            refs, defs = fu.scan_footnotes(view.substr(sublime.Region(begin, end)), begin)
+        cls.viewports[vid] = (change_count, begin, end, refs, defs)
+        view.add_regions(fu.REFERENCE_KEY, [sublime.Region(r[0], r[1]) for r in refs],
+                         '', 'cross', sublime.HIDDEN)
+        view.add_regions(fu.DEFINITION_KEY, [sublime.Region(d[0], d[1]) for d in defs],
+                         '', 'cross', sublime.HIDDEN)
+
+    @classmethod
+    def update(cls, view):
+        if not view.is_valid():
+            return
+        if cls.in_viewport_mode(view):
+            cls.mark_viewport(view)
+            return
+        cls.viewports.pop(view.id(), None)
+        vid = view.id()
+        change_count = view.change_count()
+        if cls.scanned.get(vid) == change_count:
+            return
+        cls.scanned[vid] = change_count
+        index = get_footnote_index(view)
+        published = cls.published.get(vid)
+        if published is not None and published[0] is index and published[1] == index.version:
+            return
+        cls.published[vid] = (index, index.version)
+        view.add_regions(fu.REFERENCE_KEY, [sublime.Region(r[0], r[1]) for r in index.refs.entries()],
+                         '', 'cross', sublime.HIDDEN)
+        view.add_regions(fu.DEFINITION_KEY, [sublime.Region(d[0], d[1]) for d in index.defs.entries()],
+                         '', 'cross', sublime.HIDDEN)
+
+    def on_modified(self):
+        scheduler.schedule("footnote-regions", self.view.id(), None, self.view)
+
+    def on_load(self):
+        FootnoteRegionsUpdater.update(self.view)
+
+    def on_activated(self):
+        FootnoteRegionsUpdater.update(self.view)
+
+    def on_selection_modified(self):
+        # the API reports no scrolling, so catch up whenever the cursor moves
+        view = self.view
+        if FootnoteRegionsUpdater.in_viewport_mode(view):
+            marked = FootnoteRegionsUpdater.viewports.get(view.id())
+            if marked is not None and marked[0] != view.change_count():
+                # typing: leave it to the update once the burst is over
+                return
+            FootnoteRegionsUpdater.mark_viewport(view)
+
+
+class FootnoteCacheEvent(sublime_plugin.EventListener):
+    """
+    Drops everything cached for a view once it is closed, and for its
+    buffer once its last view is, also for views that left reSt syntax
+    before being closed
+    """
+    def on_close(self, view):
+        LargeFileMode.active.pop(view.id(), None)
+        FootnoteRegionsUpdater.viewports.pop(view.id(), None)
+        scheduler.cancel(view.id(), "footnote-regions")
+        FootnoteRegionsUpdater.scanned.pop(view.id(), None)
+        FootnoteRegionsUpdater.published.pop(view.id(), None)
+        if closes_buffer(view):
+            FootnoteIndexUpdater.indexes.pop(view.buffer_id(), None)
 
-    def on_modified(self, view):
-        self.update_footnote_data(view)
 
-    def on_load(self, view):
-        self.update_footnote_data(view)
+# main thread, as the index is also fed from on_text_changed
+scheduler.register("footnote-regions", lambda task: FootnoteRegionsUpdater.update(task.args[0]),
+                   priority=1, delay=300)
 
 
 class MagicFootnotesCommand(sublime_plugin.TextCommand):
     def run(self, edit):
+        index = get_footnote_index(self.view)
         if (fu.is_footnote_definition(self.view)):
             self.view.run_command('go_to_footnote_reference')
-        elif (fu.is_footnote_reference(self.view)):
+        elif (fu.is_footnote_reference(self.view, index)):
             self.view.run_command('go_to_footnote_definition')
         else:
             self.view.run_command('insert_footnote')
@@ -274,7 +636,7 @@ class InsertFootnoteCommand(sublime_plugin.TextCommand):
             pluginCentral.status_message('Command is Void (multiple cursors)')
             return
         startloc = self.view.sel()[-1].end()
-        markernum = fu.get_next_footnote_marker(self.view)
+        markernum = fu.get_next_footnote_marker(get_footnote_index(self.view))
         if bool(self.view.size()): # the view has text?
             # find the next space|eol, in case we've tried to insert a footnote ref mid-word
             targetloc = self.view.find('(\s|$)', startloc).begin()
@@ -287,23 +649,6 @@ class InsertFootnoteCommand(sublime_plugin.TextCommand):
         self.view.sel().add(sublime.Region(self.view.size())) # put cursor at eof
         self.view.show(self.view.size()) # make eof visible on screen
 
-class MarkFootnotes(sublime_plugin.EventListener):
-    def update_footnote_data(self, view):
-        if view.syntax() is not None:
-            if view.syntax().scope == "text.restructuredtext":
-                # print(f'updating footnotes regions: File={view.file_name()}')
-                view.add_regions(fu.REFERENCE_KEY, view.find_all(fu.REFERENCE_REGEX), '', 'cross', sublime.HIDDEN)
-                view.add_regions(fu.DEFINITION_KEY, view.find_all(fu.DEFINITION_REGEX), '', 'cross', sublime.HIDDEN)
-                # print(f'Footnote Ref Regions: {view.get_regions(fu.REFERENCE_KEY)}')
-                # print(f'Footnote Def Regions: {view.get_regions(fu.DEFINITION_KEY)}')
-
-    def on_modified(self, view):
-        self.update_footnote_data(view)
-
-    def on_activated(self, view):
-        self.update_footnote_data(view)
-
-
 class GoToFootnoteReferenceCommand(sublime_plugin.TextCommand):
     def run(self, edit):
         selList = self.view.sel()
@@ -314,21 +659,22 @@ class GoToFootnoteReferenceCommand(sublime_plugin.TextCommand):
         if not match:
             pluginCentral.status_message('Command is Void (cursor must be in first line of footnote definition)')
             return
-        refs = fu.get_footnote_references(self.view)
-        if not refs:
+        index = get_footnote_index(self.view)
+        if not len(index.refs):
             pluginCentral.status_message('Command is Void (document contains no footnote references)')
             return
         target = match.groups()[0]
         if not target:
             pluginCentral.status_message('Command is Void (footnote error - cannot find a number in the footnote definition)')
             return
-        if not target in refs:
+        refs = fu.get_footnote_references(index, target)
+        if not refs:
             pluginCentral.status_message(f'Command is Void (footnote error - reference for footnote #{target} does not exist.)')
             return
-        if len(refs[target]) > 1:
-            pluginCentral.status_message(f'Info: Document contains {len(refs[target])} references to footnote #{target}.')
+        if len(refs) > 1:
+            pluginCentral.status_message(f'Info: Document contains {len(refs)} references to footnote #{target}.')
 
-        note = refs[target][0] # get first ref (nearest start of page), there may be many refs
+        note = refs[0] # get first ref (nearest start of page), there may be many refs
         point = sublime.Region(note.end(), note.end())
         self.view.sel().clear()
         self.view.sel().add(point)
@@ -337,44 +683,47 @@ class GoToFootnoteReferenceCommand(sublime_plugin.TextCommand):
 
 class GoToFootnoteDefinitionCommand(sublime_plugin.TextCommand):
     def run(self, edit):
-        defs = fu.get_footnote_definition_markers(self.view)
+        index = get_footnote_index(self.view)
         selList = self.view.sel()
-        cursorRegion = selList[0]
-        refRegions = self.view.get_regions(fu.REFERENCE_KEY)
 
         if not len(selList) == 1:
             pluginCentral.status_message('Command is Void (multiple cursors)')
             return
-        if not defs or not refRegions:
+        if not len(index.defs) or not len(index.refs):
             pluginCentral.status_message('Command is Void (no footnote pairings in document)')
             return 
 
-        target = None
         cursorRegion = selList[0]
-
-        for region in refRegions:
-            # fuzzyHitRegion expanded to one character either side of footnote ref region
-            # i.e. ·[X]_·   so a 'close by' cursor is recognised
-            if region.a < region.b:
-                fuzzyHitRegion = sublime.Region(region.a -1, region.b + 1)
-            else:
-                fuzzyHitRegion = sublime.Region(region.a +1, region.b - 1)
-            if cursorRegion.intersects(fuzzyHitRegion):
-                # get footnote number from region string
-                target = self.view.substr(region)[1:-2]
-                break
+        near = index.reference_near(cursorRegion.begin(), cursorRegion.end())
+        target = near[2] if near else None
+        defn = fu.get_footnote_definition_marker(index, target) if target else None
 
         if not target:
             pluginCentral.status_message('Command is Void (cursor not in footnote reference)')
-        elif target not in defs:
+        elif defn is None:
             pluginCentral.error_message((f'Cannot navigate to footnote definition number {target}, as it '
                 'does not exist. Please ensure your footnote references match your footnote definitions, numbers wise.'))
         else:
             self.view.sel().clear()
-            point = defs[target].end() + 1
+            point = defn.end() + 1
             ref = sublime.Region(point, point)
             self.view.sel().add(ref)
-            self.view.show(defs[target])
+            self.view.show(defn)
+
+class RenumberFootnotesCommand(sublime_plugin.TextCommand):
+    """
+    Renumber every footnote by order of first reference (optionally also
+    sorting the definitions to match), as one computed replacement and so
+    one undo step.
+    """
+    def run(self, edit, reorder_definitions=False):
+        text = self.view.substr(sublime.Region(0, self.view.size()))
+        edits, mapping = fu.renumber_footnotes(text, reorder_definitions)
+        if not edits:
+            pluginCentral.status_message('Command is Void (footnotes already numbered in order)')
+            return
+        replace_in_one_go(self.view, edit, edits, text)
+        pluginCentral.status_message(f'Renumbered {len(mapping)} footnotes')
 
 #footnotesENDfootnotesENDfootnotesENDfootnotesENDfootnotesENDfootnotesENDfootnotesEND
 
@@ -387,7 +736,6 @@ class SurroundCommand(sublime_plugin.TextCommand):
     surround = ''
 
     def run(self, edit):
-        print(f'running surroundcommand with [{self.surround}]')
         try:
             formatToRstSyntax = self.view.syntax().scope == "text.restructuredtext"
         except:
@@ -444,168 +792,115 @@ class SubstitutionCommand(SurroundCommand):
 
 #headersSTARTheadersSTARTheadersSTARTheadersSTARTheadersSTARTheadersSTARTheadersSTART
 
-# reference:
-#   http://docutils.sourceforge.net/docs/ref/rst/restructuredtext.html#sections
-ADORNMENTS = r"""[!\"#$%&'\\()*+,\-./:;<=>?@\[\]\^_`{|}~]"""
-PATTERN_RE = re.compile(r"^(%s*)\n(.+)\n(%s+)" % (ADORNMENTS, ADORNMENTS), re.MULTILINE)
-
-Header = namedtuple('Header', "level start end adornment title raw idx")
-
-
-class RstHeaderTree(object):
-    # based on sphinx's header conventions
-    DEFAULT_HEADERS = '** = - ^ " + ~ # \' :'.split()
-
-    def __init__(self, text):
-        # add a ficticius break as first line
-        # to allow catching a very first header without overline.
-        # This imply any position returned (Header.start, Header.end)
-        # must be decremented one character
-
-        self.headers = self._parse('\n' + text)
-        self._text_length = len(text)
-
-    def _parse(self, text):
-        """
-        Given a chunk of restructuredText, returns a list of tuples
-        (level, start, end, adornment, title, raw) for each header found.
+class HeaderIndexUpdater(sublime_plugin.TextChangeListener):
+    """
+    Keeps the header index of a buffer in step with its edits.
+    Buffers get an index the first time a header command runs in them,
+    until then this listener does nothing.
+
+    The indexes live in a bounded LRU cache keyed by buffer id; each index
+    remembers the change_count it is valid for and memoizes its tree for
+    that change_count, so commands on an unchanged buffer reuse the tree.
+    Caps come from the headerCacheMaxBuffers/headerCacheMaxHeaders settings.
+    """
+    indexes = LRUCache(max_entries=32, max_weight=250000)
+    # documents at least this big get their full parse done off the UI thread
+    async_min_size = 1000000
 
+    @classmethod
+    def is_applicable(cls, buffer):
+        return is_rst_buffer(buffer)
 
-        level: int (zero-based). the "weight" of the header.
-        start: index where the header starts
-        end: index where the header ends
-        adornment: one (just underlined) or two char
-                    (over and underline) string
-                    that represent the adornment,
-        title: the parsed title
-        raw : the raw parsed header text, including breaks.
+    def on_text_changed(self, changes):
+        bid = self.buffer.id()
+        index = HeaderIndexUpdater.indexes.get(bid)
+        if index is None and not scheduler.busy("header-parse", bid):
+            return
+        view = self.buffer.primary_view()
+        change_count = view.change_count() if view is not None else None
+        # a background parse of the previous text is out of date
+        scheduler.advance(bid, change_count)
+        if index is None:
+            return
+        for change in changes:
+            index.apply_change(change.a.pt, change.b.pt, change.str)
+        index.change_count = change_count
 
-        """
+    def on_reload(self):
+        HeaderIndexUpdater.indexes.pop(self.buffer.id(), None)
 
-        candidates = PATTERN_RE.findall(text)
-        headers = []
-        levels = []
-        idx = 0
-
-        for over, title, under in candidates:
-            # validate.
-            if ((over == '' or over == under) and len(under) >= len(title)
-                    and len(set(under)) == 1):
-                # encode the adornment of the header to calculate its level
-                adornment = under[0] * (2 if over else 1)
-                if adornment not in levels:
-                    levels.append(adornment)
-                level = levels.index(adornment)
-                raw = (over + '\n' if over else '') + title + '\n' + under
-                start = text.find(raw) - 1  # see comment on __init__
-                end = start + len(raw)
-                h = Header(level, start, end, adornment, title, raw, idx)
-                idx += 1
-                headers.append(h)
-        return headers
-
-    def belong_to(self, pos):
-        """
-        given a cursor position, return the deeper header
-        that contains it
-        """
-        match = []
-        for h in self.headers:
-            start, end = self.region(h)
-            if start <= pos <= end:
-                match.append(h)
-        try:
-            return sorted(match, key=lambda h: h.level, reverse=True)[0]
-        except IndexError:
-            return None
+    def on_revert(self):
+        HeaderIndexUpdater.indexes.pop(self.buffer.id(), None)
 
-    def region(self, header):
-        """
-        determines the (start, end) region under the given header
-        A region ends when a header of the same or higher level
-        (i.e lower number) is found or at the EOF
-        """
 
-        try:
-            index = self.headers.index(header)
-        except ValueError:
-            return
+def parse_headers_async(view):
+    """
+    Build a fresh header index for the view on the async thread. It is
+    published (on the main thread) only if the buffer did not change in the
+    meantime, and abandoned as soon as an edit arrives.
+    """
+    scheduler.schedule("header-parse", view.buffer_id(), view.change_count(), view)
 
-        start = header.start
-        if index == len(self.headers) - 1:     # last header
-            return (start, self._text_length)
 
-        for next_h in self.headers[index + 1:]:
-            if next_h.level <= header.level:
-                return (start, next_h.start - 1)
+def _parse_headers(task):
+    view = task.args[0]
+    index = HeaderIndex()
 
-        return (start, self._text_length)
+    def publish():
+        if not task.cancelled() and view.change_count() == index.change_count:
+            HeaderIndexUpdater.indexes.put(task.key, index, len(index.entries))
 
-    def _index(self, header, same_or_high=False):
-        """
-        helper method that returns the absolute index
-        of the header in the tree or a filteredr tree
-        If same_or_high is true, only move to headline with the same level
-        or higher level.
+    if index.rebuild(ViewTextSource(view), task.change_count, task.cancelled):
+        sublime.set_timeout(publish, 0)
 
-        returns (index, headers)
-        """
-        if same_or_high:
-            headers = [h for h in self.headers
-                       if h.level <= header.level]
-        else:
-            headers = self.headers[:]
-        return headers.index(header), headers
 
-    def next(self, header, same_or_high=False):
-        """
-        given a header returns the closer header
-        (down direction)
-        """
-        index, headers = self._index(header, same_or_high)
-        try:
-            return headers[index + 1]
-        except IndexError:
-            return None
+scheduler.register("header-parse", _parse_headers, priority=0, run_async=True)
 
-    def prev(self, header, same_or_high=False, offset=-1):
-        """same than next, but in reversed direction
-        """
-        index, headers = self._index(header, same_or_high)
-        if index == 0:
-            return None
-        return headers[index + offset]
-
-    def levels(self):
-        """ returns the heading adornment map"""
-        _levels = RstHeaderTree.DEFAULT_HEADERS.copy()
-        for h in self.headers:
-            _levels[h.level] = h.adornment
-        levels = []
-        for adornment in _levels:
-            if adornment not in levels:
-                levels.append(adornment)
-        for adornment in RstHeaderTree.DEFAULT_HEADERS:
-            if adornment not in levels:
-                if len(adornment) == 2:
-                    levels.insert(0, adornment)
-                else:
-                    levels.append(adornment)
-        return levels
 
-    @classmethod
-    def make_header(cls, title, adornment, force_overline=False):
-        title = title.rstrip()
-        title_lenght = len(title.lstrip())
-        indent_lenght = len(title) - title_lenght
-        title_lenght += len(''.join(re.compile(u"[\u4e00-\u9fa5]+").findall(title)))
-        title_lenght += len(''.join(re.compile(u"[\uac00-\ud7af]+").findall(title)))
-        strike = adornment[0] * (title_lenght + indent_lenght * 2)
-        if force_overline or len(adornment) == 2:
-            result = strike + '\n' + title + '\n' + strike + '\n'
-        else:
-            result = title + '\n' + strike + '\n'
-        return result
+def get_header_tree(view, allow_stale=False):
+    """
+    Return the RstHeaderTree of the view, rescanning only what has been
+    edited since the last call. A full parse only happens the first time,
+    or if the index has somehow fallen out of step with the buffer.
+
+    For documents over the headerAsyncParseMinSize setting (and in large
+    file mode) that full parse runs in the background: meanwhile the last
+    completed tree is returned if allow_stale is true (fine for
+    navigation), otherwise None.
+    """
+    source = ViewTextSource(view)
+    index = HeaderIndexUpdater.indexes.get(view.buffer_id())
+    if (index is None or index.change_count != view.change_count()
+            or index.size != view.size()):
+        if view.size() >= HeaderIndexUpdater.async_min_size or LargeFileMode.is_large(view):
+            parse_headers_async(view)
+            if index is None or not allow_stale:
+                pluginCentral.status_message('Indexing headers of this large document, please retry shortly')
+                return None
+            return index.tree()
+        index = HeaderIndex()
+        index.rebuild(source, view.change_count())
+    else:
+        index.flush(source)
+    # (re)store to refresh its weight and LRU position
+    HeaderIndexUpdater.indexes.put(view.buffer_id(), index, len(index.entries))
+    return index.tree()
+
+
+class HeaderCacheEvent(sublime_plugin.EventListener):
+    """
+    Drops everything cached for a view once it is closed, and for its
+    buffer once its last view is
+    """
+    def on_close(self, view):
+        # a background parse may be reading this very view: the next
+        # command parses again from a view still open
+        scheduler.cancel(view.buffer_id(), "header-parse")
+        if closes_buffer(view):
+            HeaderIndexUpdater.indexes.pop(view.buffer_id())
+            scheduler.change_counts.pop(view.buffer_id(), None)
+        HeaderChangeLevelCommand.views.pop(view.id(), None)
+        HeaderChangeLevelEvent.listen.pop(view.id(), None)
 
 
 class HeaderChangeLevelCommand(sublime_plugin.TextCommand):
@@ -624,8 +919,9 @@ class HeaderChangeLevelCommand(sublime_plugin.TextCommand):
         HeaderChangeLevelEvent.listen.pop(vid, None)
 
         cursor_pos = self.view.sel()[0].begin()
-        region = sublime.Region(0, self.view.size())
-        tree = RstHeaderTree(self.view.substr(region))
+        tree = get_header_tree(self.view)
+        if tree is None:
+            return
 
         parent = tree.belong_to(cursor_pos)
 
@@ -664,11 +960,65 @@ class HeaderChangeLevelDownCommand(HeaderChangeLevelCommand):
     movingOnUp = False
 
 
-class HeaderChangeLevelEvent(sublime_plugin.EventListener):
+class HeaderSubtreeChangeLevelCommand(sublime_plugin.TextCommand):
+    """
+    increase or decrease, by `steps` levels, the header of the section
+    under each cursor together with all of its subsections.
+    For a non empty selection, every header starting inside it is changed.
+    All headers are rewritten in one pass (so one undo step), and nothing
+    but the headers themselves is touched.
+    """
+    movingOnUp = True
+
+    def run(self, edit, steps=1):
+        offset = steps * [1, -1][self.movingOnUp]
+        tree = get_header_tree(self.view)
+        if tree is None:
+            return
+
+        targets = {}
+        for sel in self.view.sel():
+            if sel.empty():
+                headers = tree.subtree(tree.belong_to(sel.begin()))
+            else:
+                headers = tree.headers_between(sel.begin(), sel.end())
+            for h in headers:
+                targets[h.idx] = h
+        if not targets:
+            pluginCentral.status_message('Command is Void (cursor not within a section)')
+            return
+
+        levels = tree.levels()
+        edits = []
+        for idx in sorted(targets):
+            h = targets[idx]
+            level = levels.index(h.adornment) + offset
+            if not 0 <= level < len(levels):
+                pluginCentral.status_message(f'Command is Void (header "{h.title.strip()}" is already at the limit level)')
+                return
+            edits.append((h.start, h.end + 1, RstHeaderTree.make_header(h.title, levels[level])))
+
+        # a single replace: one change for the header and footnote indexes
+        # to take in, however many headers
+        replace_in_one_go(self.view, edit, edits)
+
+class HeaderSubtreeLevelUpCommand(HeaderSubtreeChangeLevelCommand):
+    movingOnUp = True
+
+
+class HeaderSubtreeLevelDownCommand(HeaderSubtreeChangeLevelCommand):
+    movingOnUp = False
+
+
+class HeaderChangeLevelEvent(sublime_plugin.ViewEventListener):
     listen = {}
 
-    def on_modified(self, view):
-        vid = view.id()
+    @classmethod
+    def is_applicable(cls, settings):
+        return is_rst_syntax(settings)
+
+    def on_modified(self):
+        vid = self.view.id()
         if HeaderChangeLevelEvent.listen.get(vid):
             del HeaderChangeLevelCommand.views[vid]
             del HeaderChangeLevelEvent.listen[vid]
@@ -688,8 +1038,9 @@ class SkipToHeaderBaseCommand(sublime_plugin.TextCommand):
 
         """
         cursor_pos = self.view.sel()[0].begin()
-        region = sublime.Region(0, self.view.size())
-        tree = RstHeaderTree(self.view.substr(region))
+        tree = get_header_tree(self.view, allow_stale=True)
+        if tree is None:
+            return
         parent = tree.belong_to(cursor_pos)
 
         if self.forward:
@@ -731,16 +1082,16 @@ class HeaderFoldingOnOffCommand(sublime_plugin.TextCommand):
     def run(self, edit):
 
         cursor_pos = self.view.sel()[0].begin()
-        region = sublime.Region(0, self.view.size())
-        tree = RstHeaderTree(self.view.substr(region))
+        tree = get_header_tree(self.view, allow_stale=True)
+        if tree is None:
+            return
         parent = tree.belong_to(cursor_pos)
         is_in_header = parent.start <= cursor_pos <= parent.end
         if is_in_header:
             start, end = tree.region(parent)
             start += len(parent.raw) + 1
             region = sublime.Region(start, end)
-            if any([i.contains(region) for i in
-                    self.view.folded_regions()]):
+            if self.view.is_folded(region):
                 self.view.unfold(region)
             else:
                 self.view.fold(region)
@@ -750,6 +1101,41 @@ class HeaderFoldingOnOffCommand(sublime_plugin.TextCommand):
                 self.view.show(r)
 
 
+class HeaderFoldToLevelCommand(sublime_plugin.TextCommand):
+    """
+    Fold everything but the headers of the first `level` levels,
+    with all the regions worked out in one pass and folded in one call.
+    """
+    def run(self, edit, level=1):
+        tree = get_header_tree(self.view, allow_stale=True)
+        if tree is None:
+            return
+        self.view.unfold_all()
+        self.view.fold([sublime.Region(a, b) for a, b in tree.fold_to_level(level)])
+
+
+class HeaderUnfoldAllCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        self.view.unfold_all()
+
+
+class HeaderFocusSectionCommand(sublime_plugin.TextCommand):
+    """
+    Fold everything except the section at the (first) cursor,
+    leaving the surrounding headers of the same or higher level visible.
+    """
+    def run(self, edit):
+        tree = get_header_tree(self.view, allow_stale=True)
+        if tree is None:
+            return
+        parent = tree.belong_to(self.view.sel()[0].begin())
+        if parent is None:
+            pluginCentral.status_message('Command is Void (cursor not within a section)')
+            return
+        self.view.unfold_all()
+        self.view.fold([sublime.Region(a, b) for a, b in tree.focus(parent)])
+
+
 class HeaderMarkingsFillerCommand(BaseBlockCommand):
     def run(self, edit):
         for region in self.view.sel():
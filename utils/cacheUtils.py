@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Small least-recently-used cache with both an entry cap and a weight cap
+    (the caller decides what an entry weighs, e.g. its number of headers).
+    The entry just stored is never evicted, even if it alone is over the
+    weight cap, so the caller always gets back what it asked for.
+    """
+
+    def __init__(self, max_entries=32, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._items = OrderedDict()  # key -> (value, weight)
+        self.weight = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """return the value for key (and mark it as most recently used)"""
+        try:
+            value, weight = self._items[key]
+        except KeyError:
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value, weight=1):
+        """store (or re-weigh) value under key, then evict down to the caps"""
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.weight -= old[1]
+        self._items[key] = (value, weight)
+        self.weight += weight
+        self._evict()
+
+    def pop(self, key, default=None):
+        item = self._items.pop(key, None)
+        if item is None:
+            return default
+        self.weight -= item[1]
+        return item[0]
+
+    def clear(self):
+        self._items.clear()
+        self.weight = 0
+
+    def resize(self, max_entries=None, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._evict()
+
+    def _evict(self):
+        while len(self._items) > 1 and (
+                (self.max_entries is not None and len(self._items) > self.max_entries)
+                or (self.max_weight is not None and self.weight > self.max_weight)):
+            key, (value, weight) = self._items.popitem(last=False)
+            self.weight -= weight
@@ -26,5 +26,16 @@ pluginSettingsGovernor = {
         # "imgTypePrefs"          : {"default": ['png', 'jpg', 'jpeg'], "checks": ["is_list_of_oom_strings"]},
         # "imgNameFormat"         : {"default": "%Y-%m-%d--%H:%M:%Simage", "checks": ["is_str"]},
         # "roleDetails"           : {"default": [], "checks": ["is_list"]}
+        "headerCacheMaxBuffers"   : {"default": 32, "checks": ["is_int"]},
+        "headerCacheMaxHeaders"   : {"default": 250000, "checks": ["is_int"]},
+        "headerAsyncParseMinSize" : {"default": 1000000, "checks": ["is_int"]},
+        "footnoteUpdateDelay"     : {"default": 300, "checks": ["is_int"]},
+        "schedulerTickBudget"     : {"default": 8, "checks": ["is_int"]},
+        "instrumentation"         : {"default": False, "checks": ["is_bool"]},
+        "instrumentationSamplesFile": {"default": "", "checks": ["is_str"]},
+        "footnoteViewportMinSize" : {"default": 1000000, "checks": ["is_int"]},
+        "footnoteViewportMargin"  : {"default": 10000, "checks": ["is_int"]},
+        "largeFileMinSize"        : {"default": 5000000, "checks": ["is_int"]},
+        "largeFileMinLines"       : {"default": 100000, "checks": ["is_int"]},
     }
 }
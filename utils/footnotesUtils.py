@@ -1,63 +1,278 @@
 import sublime
-import sublime_plugin
 import re
 
+from .gapUtils import GapList
+
 DEFINITION_KEY = 'footnote-definitions'
 REFERENCE_KEY = 'footnote-references'
 REFERENCE_REGEX = r'\[(\d+)\]\_'
-DEFINITION_REGEX = r"^\.\.\s\[(\d+)\]"
-
-
-def __get_id(txt):
-    return re.findall(r'\d+', txt)[0]
-
-def __get_footnote_identifiers(view):
-    ids = get_footnote_references(view).keys()
-    list(ids).sort()
-    return ids
-
-def __get_last_footnote_marker(view):
-    ids = sorted([int(a) for a in __get_footnote_identifiers(view) if a.isdigit()])
-    if len(ids):
-        return int(ids[-1])
-    else:
-        return 0
-
-def get_footnote_references(view):
-    ids = {}
-    for ref in view.get_regions(REFERENCE_KEY):
-        # [01]_ pattern could be part of a footnote definition rather than an inline footnote reference
-        # i.e. it could be ..[1]_ footnote text
-        if not re.match(DEFINITION_REGEX, view.substr(view.line(ref))):
-            # we now know the 'ref' is not part of a footnote definition
-            # we can safely assume it's a footnote reference
-            id = __get_id(view.substr(ref)) # extract the number
-            if id in ids:
-                ids[id].append(ref)
+# a blank rather than any whitespace after the dots: a definition marker
+# split over two lines would escape the rescans of the edited lines
+DEFINITION_REGEX = r"^\.\.[ \t]\[(\d+)\]"
+# references and definitions in one pattern, so a single scan finds both;
+# the bracket of a definition is only looked ahead at, so that .. [6]_ is
+# both a definition and a reference, as with separate searches
+FOOTNOTE_RE = re.compile(r"(?P<ref>%s)|(?P<def>^\.\.[ \t](?=\[(\d+)\]))" % REFERENCE_REGEX, re.MULTILINE)
+
+
+def scan_footnotes(text, base=0):
+    """
+    Single pass over text for both footnote references and definitions.
+    Returns two lists, offset by base:
+      references as (begin, end, number, in_definition) tuples, where
+      in_definition flags a reference sitting on a definition line,
+      definitions as (begin, end, number) tuples.
+    """
+    refs = []
+    defs = []
+    def_line_end = -1
+    for m in FOOTNOTE_RE.finditer(text):
+        if m.group('ref') is not None:
+            refs.append((base + m.start(), base + m.end(), m.group(2), m.start() < def_line_end))
+        else:
+            marker_end = m.end(4) + 1
+            defs.append((base + m.start(), base + marker_end, m.group(4)))
+            def_line_end = text.find('\n', marker_end)
+            if def_line_end < 0:
+                def_line_end = len(text)
+    return refs, defs
+
+
+class FootnoteIndex(object):
+    """
+    Footnote references and definitions of one buffer, kept up to date from
+    text-change deltas: an edit drops the footnotes it touched and queues its
+    lines for a rescan (footnote markup never spans lines), everything after
+    it moves along for free (see GapList).
+
+    The text source handed to rebuild/flush needs size(), line(pt) returning
+    (begin, end) of the line containing pt, and substr(begin, end).
+    """
+
+    def __init__(self):
+        self.refs = GapList(key=_reference_number)
+        self.defs = GapList(key=_definition_number)
+        self.dirty = []    # sorted [begin, end] spans awaiting a rescan
+        self.size = 0
+        self.change_count = None
+        self.version = 0   # bumped whenever the set of footnotes changes
+        self._max_number = 0   # None when the highest reference number is gone
+
+    def rebuild(self, source, change_count=None):
+        """full (re)scan of the document"""
+        self.size = source.size()
+        refs, defs = scan_footnotes(source.substr(0, self.size))
+        self.refs = GapList(refs, self.size, key=_reference_number)
+        self.defs = GapList(defs, self.size, key=_definition_number)
+        self._max_number = None
+        self.dirty = []
+        self.change_count = change_count
+        self.version += 1
+
+    def apply_change(self, a, b, inserted):
+        """
+        Record the replacement of [a, b) by the string inserted, with a and b
+        given in the coordinates of the buffer before this change.
+        """
+        delta = len(inserted) - (b - a)
+        for entries in (self.refs, self.defs):
+            removed = entries.remove(a, b)
+            if removed:
+                self.version += 1
+                if entries is self.refs:
+                    self._drop_numbers(removed)
+            entries.size += delta
+
+        new_end = a + len(inserted)
+        dirty = []
+        for lo, hi in self.dirty:
+            if hi < a:
+                dirty.append([lo, hi])
+            elif lo > b:
+                dirty.append([lo + delta, hi + delta])
+            else:
+                a, new_end = min(a, lo), max(new_end, hi + delta)
+        dirty.append([a, new_end])
+        dirty.sort()
+        self.dirty = dirty
+        self.size += delta
+
+    def flush(self, source):
+        """rescan the lines of every edit recorded since the last flush"""
+        windows = []
+        for lo, hi in self.dirty:
+            begin = source.line(min(lo, self.size))[0]
+            end = source.line(min(hi, self.size))[1]
+            if windows and begin <= windows[-1][1]:
+                windows[-1][1] = max(end, windows[-1][1])
             else:
-                ids[id] = [ref]
-    return ids # dict of { "num": Region } for footnote refs in the view
+                windows.append([begin, end])
+        for begin, end in windows:
+            refs, defs = scan_footnotes(source.substr(begin, end), begin)
+            for entries, found in ((self.refs, refs), (self.defs, defs)):
+                removed = entries.remove(begin, end)
+                if removed != found:
+                    self.version += 1
+                    if entries is self.refs:
+                        self._drop_numbers(removed)
+                        self._add_numbers(found)
+                entries.insert(found)
+        self.dirty = []
+
+    def _drop_numbers(self, refs):
+        if self._max_number is not None and any(
+                not in_definition and int(number) == self._max_number
+                for begin, end, number, in_definition in refs):
+            self._max_number = None
+
+    def _add_numbers(self, refs):
+        if self._max_number is not None:
+            for begin, end, number, in_definition in refs:
+                if not in_definition:
+                    self._max_number = max(self._max_number, int(number))
+
+    def references(self, number):
+        """(begin, end) of each reference to footnote #number, in document order"""
+        return [ref[:2] for ref in self.refs.with_key(number)]
+
+    def definition(self, number):
+        """(begin, end) of the definition marker of footnote #number, or None"""
+        defs = self.defs.with_key(number)
+        return defs[-1][:2] if defs else None
+
+    def max_reference_number(self):
+        # only rederived when the highest numbered reference went away
+        if self._max_number is None:
+            self._max_number = max(map(int, self.refs.keys()), default=0)
+        return self._max_number
+
+    def reference_near(self, begin, end):
+        """
+        first reference (begin, end, number, in_definition) touching [begin, end],
+        so a 'close by' cursor (i.e. ·[X]_·) is recognised, or None
+        """
+        i = max(0, self.refs.last_starting_at(begin) - 1)
+        while i < len(self.refs):
+            ref = self.refs[i]
+            if ref[0] > end:
+                break
+            if begin <= ref[1]:
+                return ref
+            i += 1
+        return None
+
+
+def _reference_number(ref):
+    # [01]_ pattern could be part of a footnote definition rather than an inline footnote reference
+    return None if ref[3] else ref[2]
+
+
+def _definition_number(defn):
+    return defn[2]
+
+
+def _definition_block_end(text, pos):
+    """
+    end of the footnote definition whose marker ends at pos: its body runs
+    on over indented (or blank) lines, trailing blank lines excluded
+    """
+    end = text.find('\n', pos)
+    if end < 0:
+        return len(text)
+    line_end = end
+    while line_end < len(text):
+        line_start = line_end + 1
+        line_end = text.find('\n', line_start)
+        if line_end < 0:
+            line_end = len(text)
+        line = text[line_start:line_end]
+        if line.strip():
+            if not line[0].isspace():
+                break
+            end = line_end
+    return end
+
+
+def renumber_footnotes(text, reorder_definitions=False):
+    """
+    Work out the renumbering of all the footnotes of text, by order of first
+    reference: referenced numbers become 1, 2, 3... and numbers that are only
+    defined follow on in order of definition.
+    If reorder_definitions is true, the definition blocks are also sorted
+    into the slots the definitions occupied.
+
+    Returns (edits, mapping): edits is a sorted list of non overlapping
+    (begin, end, new_text) replacements, empty if nothing changes, and
+    mapping is the {old number: new number} dict.
+    """
+    refs, defs = scan_footnotes(text)
+    mapping = {}
+    for begin, end, number, in_definition in refs:
+        if not in_definition and number not in mapping:
+            mapping[number] = str(len(mapping) + 1)
+    for begin, end, number in defs:
+        if number not in mapping:
+            mapping[number] = str(len(mapping) + 1)
+
+    # only the digits are rewritten: [12]_ and .. [12]
+    edits = []
+    for begin, end, number, in_definition in refs:
+        if mapping.get(number, number) != number:
+            edits.append((begin + 1, begin + 1 + len(number), mapping[number]))
+    for begin, end, number in defs:
+        if mapping[number] != number:
+            edits.append((end - 1 - len(number), end - 1, mapping[number]))
+    # the digits of .. [12]_ are those of a definition and of a reference
+    edits = sorted(set(edits))
+
+    if reorder_definitions and defs:
+        blocks = [(begin, _definition_block_end(text, end), number) for begin, end, number in defs]
+        # renumber the text of each block, then deal the blocks out in the new order
+        block_texts = []
+        block_edits = set()
+        i = 0
+        for begin, end, number in blocks:
+            while i < len(edits) and edits[i][0] < begin:
+                i += 1
+            pieces = []
+            pos = begin
+            while i < len(edits) and edits[i][1] <= end:
+                e_begin, e_end, new = edits[i]
+                pieces.append(text[pos:e_begin])
+                pieces.append(new)
+                pos = e_end
+                block_edits.add(i)
+                i += 1
+            pieces.append(text[pos:end])
+            block_texts.append(''.join(pieces))
+        order = sorted(range(len(blocks)), key=lambda j: int(mapping[blocks[j][2]]))
+        edits = [e for j, e in enumerate(edits) if j not in block_edits]
+        for (begin, end, number), j in zip(blocks, order):
+            if block_texts[j] != text[begin:end]:
+                edits.append((begin, end, block_texts[j]))
+        edits.sort()
+
+    return edits, mapping
+
+def get_footnote_references(index, number):
+    """regions of the references to footnote #number (index: a FootnoteIndex)"""
+    return [sublime.Region(a, b) for a, b in index.references(number)]
 
-def get_footnote_definition_markers(view):
-    ids = {}
-    for defn in view.get_regions(DEFINITION_KEY):
-        id = __get_id(view.substr(defn))
-        ids[id] = defn
-    # print(f'footnote def markers: = {ids}')
-    return ids
+def get_footnote_definition_marker(index, number):
+    """region of the definition marker of footnote #number, or None"""
+    defn = index.definition(number)
+    return None if defn is None else sublime.Region(*defn)
 
-def get_next_footnote_marker(view):
-    return __get_last_footnote_marker(view) + 1
+def get_next_footnote_marker(index):
+    return index.max_reference_number() + 1
 
 def is_footnote_definition(view):
     line = view.substr(view.line(view.sel()[-1]))
     # print(f'searching line: {line} is footnote def = {re.match(DEFINITION_REGEX, line)}')
     return re.match(DEFINITION_REGEX, line)
 
-def is_footnote_reference(view):
-    refs = view.get_regions(REFERENCE_KEY)
-    for ref in refs:
-        # print(f'sel region = {view.sel()[0]}')
-        if ref.contains(view.sel()[0]):
-            return True
-    return False
+def is_footnote_reference(view, index):
+    sel = view.sel()[0]
+    i = index.refs.last_starting_at(sel.begin())
+    # references never overlap, so only the last one starting before the cursor can contain it
+    return i >= 0 and index.refs[i][1] >= sel.end()
@@ -0,0 +1,112 @@
+class GapList(object):
+    """
+    Sorted, non overlapping (begin, end, ...) entries of a buffer, split at
+    the point of the latest edit. Entries before the split keep absolute
+    positions, those after it are held as distances from the end of the
+    buffer, so an edit never has to shift anything: only the entries lying
+    between two consecutive edit points change sides.
+
+    Given a key function, the entries are also grouped by key (entries
+    whose key is None are left out) for with_key() to look up. The groups
+    are made on the first lookup, and from then on follow the entries from
+    side to side as they move.
+    """
+
+    def __init__(self, entries=(), size=0, key=None):
+        self.head = list(entries)  # absolute positions, document order
+        self.tail = []             # distances from the end, reverse document order
+        self.size = size
+        self.key = key
+        self.groups = None         # key -> {(in tail, entry as held)}, once looked up
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    @staticmethod
+    def _flip(entry, size):
+        return (size - entry[0], size - entry[1]) + entry[2:]
+
+    def _group(self, entry, in_tail):
+        key = self.key(entry)
+        if key is not None:
+            self.groups.setdefault(key, set()).add((in_tail, entry))
+
+    def _ungroup(self, entry, in_tail):
+        key = self.key(entry)
+        if key is not None:
+            group = self.groups[key]
+            group.discard((in_tail, entry))
+            if not group:
+                del self.groups[key]
+
+    def _split(self, pos):
+        """move the split so that exactly the entries ending before pos are in head"""
+        head, tail, size = self.head, self.tail, self.size
+        keyed = self.groups is not None
+        while tail and size - tail[-1][1] < pos:
+            entry = tail.pop()
+            head.append(self._flip(entry, size))
+            if keyed:
+                self._ungroup(entry, True)
+                self._group(head[-1], False)
+        while head and head[-1][1] >= pos:
+            entry = head.pop()
+            tail.append(self._flip(entry, size))
+            if keyed:
+                self._ungroup(entry, False)
+                self._group(tail[-1], True)
+
+    def remove(self, begin, end):
+        """drop (and return) the entries touching [begin, end], leaving the split at begin"""
+        self._split(begin)
+        tail, size = self.tail, self.size
+        removed = []
+        while tail and size - tail[-1][0] <= end:
+            entry = tail.pop()
+            if self.groups is not None:
+                self._ungroup(entry, True)
+            removed.append(self._flip(entry, size))
+        return removed
+
+    def insert(self, entries):
+        """add entries lying right after the split (i.e. just after remove())"""
+        self.head.extend(entries)
+        if self.groups is not None:
+            for entry in entries:
+                self._group(entry, False)
+
+    def keys(self):
+        if self.groups is None:
+            self.groups = {}
+            for in_tail, entries in ((False, self.head), (True, self.tail)):
+                for entry in entries:
+                    self._group(entry, in_tail)
+        return self.groups.keys()
+
+    def with_key(self, key):
+        """the entries of the given key, in document order (absolute positions)"""
+        self.keys()
+        size = self.size
+        return sorted(self._flip(entry, size) if in_tail else entry
+                      for in_tail, entry in self.groups.get(key, ()))
+
+    def __getitem__(self, i):
+        """the i-th entry in document order (absolute positions), in O(1)"""
+        if i < len(self.head):
+            return self.head[i]
+        return self._flip(self.tail[len(self.tail) - 1 - (i - len(self.head))], self.size)
+
+    def last_starting_at(self, pos):
+        """ordinal of the last entry beginning at or before pos (-1 if none)"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid][0] <= pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def entries(self):
+        size = self.size
+        return self.head + [self._flip(e, size) for e in reversed(self.tail)]
@@ -0,0 +1,379 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from .gapUtils import GapList
+
+# reference:
+#   http://docutils.sourceforge.net/docs/ref/rst/restructuredtext.html#sections
+ADORNMENTS = r"""[!\"#$%&'\\()*+,\-./:;<=>?@\[\]\^_`{|}~]"""
+PATTERN_RE = re.compile(r"^(%s*)\n(.+)\n(%s+)" % (ADORNMENTS, ADORNMENTS), re.MULTILINE)
+
+Header = namedtuple('Header', "level start end adornment title raw idx")
+
+
+def scan_headers(text, base=0, at_bof=True):
+    """
+    Yield a (start, end, adornment, title, raw) tuple for each valid header
+    found in text, with positions offset by base.
+
+    If at_bof is true, text is the start of the document, so a very first
+    header needs no blank line above it. Otherwise text must begin with the
+    blank line preceding its first header (see HeaderIndex.flush).
+    """
+    if at_bof:
+        # add a ficticius break as first line
+        # to allow catching a very first header without overline.
+        text = '\n' + text
+        base -= 1
+    for m in PATTERN_RE.finditer(text):
+        over, title, under = m.groups()
+        # validate.
+        if ((over == '' or over == under) and len(under) >= len(title)
+                and len(set(under)) == 1):
+            # encode the adornment of the header to calculate its level
+            adornment = under[0] * (2 if over else 1)
+            start = m.start(1) if over else m.start(2)
+            end = m.end(3)
+            yield (base + start, base + end, adornment, title, text[start:end])
+
+
+class RstHeaderTree(object):
+    # based on sphinx's header conventions
+    DEFAULT_HEADERS = '** = - ^ " + ~ # \' :'.split()
+
+    def __init__(self, text):
+        self._text_length = len(text)
+        self.headers = self._parse(text)
+
+    @classmethod
+    def from_entries(cls, entries, text_length):
+        """
+        Build a tree from already scanned (start, end, adornment, title, raw)
+        entries, as kept by HeaderIndex, without touching the document text.
+        """
+        tree = cls.__new__(cls)
+        tree._text_length = text_length
+        tree.headers = tree._build(entries)
+        return tree
+
+    def _parse(self, text):
+        """
+        Given a chunk of restructuredText, returns a list of tuples
+        (level, start, end, adornment, title, raw, idx) for each header found.
+
+
+        level: int (zero-based). the "weight" of the header.
+        start: index where the header starts
+        end: index where the header ends
+        adornment: one (just underlined) or two char
+                    (over and underline) string
+                    that represent the adornment,
+        title: the parsed title
+        raw : the raw parsed header text, including breaks.
+        idx: position of the header in the tree
+
+        """
+        return self._build(scan_headers(text))
+
+    def _build(self, entries):
+        """
+        Single pass over the scanned entries (which may be a generator):
+        assigns levels in order of first appearance of each adornment and
+        closes the section extents as it goes, using a stack of the headers
+        whose section is still open. The stack also gives, for free, each
+        header's parent and its previous/next header of the same or higher
+        level, so navigation never has to search the header list.
+        """
+        headers = []
+        levels = {}
+        self._starts = starts = []
+        self._section_ends = ends = []
+        self._parents = parents = []
+        self._prev_same_or_high = prevs = []
+        self._next_same_or_high = nexts = []
+        open_sections = []
+        for idx, (start, end, adornment, title, raw) in enumerate(entries):
+            level = levels.setdefault(adornment, len(levels))
+            # a header closes every open section of the same or deeper level
+            closed = None
+            while open_sections and headers[open_sections[-1]].level >= level:
+                closed = open_sections.pop()
+                ends[closed] = start - 1
+                nexts[closed] = idx
+            parent = open_sections[-1] if open_sections else None
+            if closed is not None and headers[closed].level == level:
+                prevs.append(closed)
+            else:
+                prevs.append(parent)
+            headers.append(Header(level, start, end, adornment, title, raw, idx))
+            starts.append(start)
+            ends.append(self._text_length)
+            parents.append(parent)
+            nexts.append(None)
+            open_sections.append(idx)
+        return headers
+
+    def _in_tree(self, header):
+        return (header is not None and 0 <= header.idx < len(self.headers)
+                and self.headers[header.idx] == header)
+
+    def belong_to(self, pos):
+        """
+        given a cursor position, return the deeper header
+        that contains it
+        """
+        # the sections open at pos are the last header starting at or before
+        # it plus its ancestors, and that last header is the deepest of them
+        idx = bisect_right(self._starts, pos) - 1
+        if idx < 0 or pos > self._section_ends[idx]:
+            return None
+        return self.headers[idx]
+
+    def region(self, header):
+        """
+        determines the (start, end) region under the given header
+        A region ends when a header of the same or higher level
+        (i.e lower number) is found or at the EOF
+        """
+        if not self._in_tree(header):
+            return
+        return (header.start, self._section_ends[header.idx])
+
+    def parent(self, header):
+        """the header whose section directly contains the given one"""
+        if not self._in_tree(header):
+            return None
+        idx = self._parents[header.idx]
+        return None if idx is None else self.headers[idx]
+
+    def subtree(self, header):
+        """the header followed by every header nested in its section"""
+        if not self._in_tree(header):
+            return []
+        last = bisect_right(self._starts, self._section_ends[header.idx])
+        return self.headers[header.idx:last]
+
+    def headers_between(self, begin, end):
+        """headers starting within [begin, end]"""
+        return self.headers[bisect_left(self._starts, begin):bisect_right(self._starts, end)]
+
+    def next(self, header, same_or_high=False):
+        """
+        given a header returns the closer header
+        (down direction)
+        If same_or_high is true, only move to headline with the same level
+        or higher level.
+        """
+        if not self._in_tree(header):
+            return None
+        if same_or_high:
+            idx = self._next_same_or_high[header.idx]
+        else:
+            idx = header.idx + 1
+        if idx is None or idx >= len(self.headers):
+            return None
+        return self.headers[idx]
+
+    def prev(self, header, same_or_high=False, offset=-1):
+        """same than next, but in reversed direction.
+        An offset of 0 returns the header itself, provided it has a predecessor
+        """
+        if not self._in_tree(header):
+            return None
+        idx = header.idx
+        for step in range(max(1, -offset)):
+            idx = self._prev_same_or_high[idx] if same_or_high else idx - 1
+            if idx is None or idx < 0:
+                return None
+        if offset == 0:
+            return header
+        return self.headers[idx]
+
+    def _gaps(self, spans, fold_leading=False):
+        """
+        given the (start, end) spans to keep visible, in document order,
+        returns the (start, end) regions between them, i.e. what to fold
+        """
+        gaps = []
+        prev_end = -1 if fold_leading else None
+        for start, end in spans:
+            if prev_end is not None and prev_end + 1 < start - 1:
+                gaps.append((prev_end + 1, start - 1))
+            prev_end = end
+        if prev_end is not None and prev_end + 1 < self._text_length:
+            gaps.append((prev_end + 1, self._text_length))
+        return gaps
+
+    def fold_to_level(self, level):
+        """
+        regions to fold so that only the headers of the first `level`
+        levels (one-based) stay visible
+        """
+        return self._gaps((h.start, h.end) for h in self.headers if h.level < level)
+
+    def focus(self, header):
+        """
+        regions to fold so that only the section of the given header stays
+        open, with the headers of the same or higher level around it as context
+        """
+        if not self._in_tree(header):
+            return []
+        last = bisect_right(self._starts, self._section_ends[header.idx])
+        spans = []
+        for h in self.headers[:header.idx]:
+            if h.level <= header.level:
+                spans.append((h.start, h.end))
+        spans.append((header.start, self._section_ends[header.idx]))
+        for h in self.headers[last:]:
+            if h.level <= header.level:
+                spans.append((h.start, h.end))
+        return self._gaps(spans, fold_leading=True)
+
+    def levels(self):
+        """ returns the heading adornment map"""
+        _levels = RstHeaderTree.DEFAULT_HEADERS.copy()
+        for h in self.headers:
+            _levels[h.level] = h.adornment
+        levels = []
+        for adornment in _levels:
+            if adornment not in levels:
+                levels.append(adornment)
+        for adornment in RstHeaderTree.DEFAULT_HEADERS:
+            if adornment not in levels:
+                if len(adornment) == 2:
+                    levels.insert(0, adornment)
+                else:
+                    levels.append(adornment)
+        return levels
+
+    @classmethod
+    def make_header(cls, title, adornment, force_overline=False):
+        title = title.rstrip()
+        title_lenght = len(title.lstrip())
+        indent_lenght = len(title) - title_lenght
+        title_lenght += len(''.join(re.compile(u"[\u4e00-\u9fa5]+").findall(title)))
+        title_lenght += len(''.join(re.compile(u"[\uac00-\ud7af]+").findall(title)))
+        strike = adornment[0] * (title_lenght + indent_lenght * 2)
+        if force_overline or len(adornment) == 2:
+            result = strike + '\n' + title + '\n' + strike + '\n'
+        else:
+            result = title + '\n' + strike + '\n'
+        return result
+
+
+class HeaderIndex(object):
+    """
+    Header index of a single buffer, kept in step with the buffer from its
+    text-change deltas so that an edit only costs a rescan of the paragraphs
+    it touched, instead of a regex pass over the whole document.
+
+    A header never spans a blank line (it can only *start* at one), so
+    rescanning from the blank line above an edit to the blank line below it
+    gives exactly what a full parse would find there. The headers after an
+    edit move along for free (see GapList).
+
+    The text source handed to rebuild/flush needs size(), line(pt) returning
+    (begin, end) of the line containing pt, and substr(begin, end).
+    """
+
+    def __init__(self):
+        self.entries = GapList()  # (start, end, adornment, title, raw), in document order
+        self.dirty = []    # sorted [begin, end] spans awaiting a rescan
+        self.size = 0
+        self.change_count = None
+        self._tree = None
+
+    def rebuild(self, source, change_count=None, cancelled=None):
+        """
+        full (re)scan of the document.
+        cancelled is an optional callable polled while scanning; if it turns
+        true the index is left untouched and False is returned.
+        """
+        size = source.size()
+        text = source.substr(0, size)
+        entries = []
+        for entry in scan_headers(text):
+            entries.append(entry)
+            if cancelled is not None and not len(entries) % 512 and cancelled():
+                return False
+        if cancelled is not None and cancelled():
+            return False
+        self.size = size
+        self.entries = GapList(entries, size)
+        self.dirty = []
+        self.change_count = change_count
+        self._tree = None
+        return True
+
+    def apply_change(self, a, b, inserted):
+        """
+        Record the replacement of [a, b) by the string inserted, with a and b
+        given in the coordinates of the buffer before this change.
+        The headers touching it are dropped and the edited span is queued
+        for a rescan.
+        """
+        delta = len(inserted) - (b - a)
+        self.entries.remove(a, b)
+        self.entries.size += delta
+
+        new_end = a + len(inserted)
+        dirty = []
+        for lo, hi in self.dirty:
+            if hi < a:
+                dirty.append([lo, hi])
+            elif lo > b:
+                dirty.append([lo + delta, hi + delta])
+            else:
+                # overlaps the edit: fold it into the new span
+                a, new_end = min(a, lo), max(new_end, hi + delta)
+        dirty.append([a, new_end])
+        dirty.sort()
+        self.dirty = dirty
+        self.size += delta
+        self._tree = None
+
+    def _window(self, source, lo, hi):
+        """
+        expand [lo, hi] to the enclosing paragraphs: from the blank line at
+        or above lo (or the start of the document) to the end of the last
+        non blank line below hi. Returns (begin, end, at_bof).
+        """
+        size = source.size()
+        begin, end = source.line(min(lo, size))
+        while begin > 0 and begin != end:
+            begin, end = source.line(begin - 1)
+        at_bof = begin == 0 and begin != end
+
+        end = source.line(min(hi, size))[1]
+        while end < size:
+            next_begin, next_end = source.line(end + 1)
+            if next_begin == next_end:
+                break
+            end = next_end
+        return begin, end, at_bof
+
+    def flush(self, source):
+        """rescan the paragraphs around every edit recorded since the last flush"""
+        if not self.dirty:
+            return
+        windows = []
+        for lo, hi in self.dirty:
+            begin, end, at_bof = self._window(source, lo, hi)
+            if windows and begin <= windows[-1][1]:
+                prev_begin, prev_end, prev_bof = windows[-1]
+                windows[-1] = (prev_begin, max(end, prev_end), prev_bof)
+            else:
+                windows.append((begin, end, at_bof))
+        for begin, end, at_bof in windows:
+            # no header straddles the blank line a window starts at
+            self.entries.remove(begin, end)
+            self.entries.insert(list(scan_headers(source.substr(begin, end), begin, at_bof)))
+        self.dirty = []
+        self._tree = None
+
+    def tree(self):
+        """RstHeaderTree for the current state of the index (flush first)"""
+        if self._tree is None:
+            self._tree = RstHeaderTree.from_entries(self.entries.entries(), self.size)
+        return self._tree
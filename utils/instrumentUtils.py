@@ -0,0 +1,163 @@
+import functools
+import json
+import math
+import threading
+import time
+
+
+class LatencyHistogram(object):
+    """
+    Log-scale histogram of durations: a quarter octave per bucket, from one
+    microsecond up, so percentiles come out within ~19% whatever the spread.
+    """
+    BUCKETS_PER_OCTAVE = 4
+
+    def __init__(self):
+        self.buckets = {}  # bucket number -> count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.max_size = 0
+
+    def add(self, seconds, size=None):
+        us = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(us) * self.BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if size is not None:
+            self.max_size = max(self.max_size, size)
+
+    def percentile(self, p):
+        """upper bound (in seconds) of the bucket holding the p-th percentile"""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+
+class Instrumentation(object):
+    """
+    Opt-in timing of the plugin entry points (TextCommand.run, the listener
+    callbacks and the scheduler jobs). Enabling it wraps those in place,
+    and disabling it puts the originals back, so it costs nothing while off.
+
+    Each call is added to the histogram of its command (or listener
+    callback) and, if a samples file is set, written to it as a JSON line.
+    """
+    COMMAND_METHODS = ("run",)
+    LISTENER_PREFIX = "on_"
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}  # "Class.method" -> LatencyHistogram
+        self.enabled = False
+        self.samples = None   # open samples file, if any
+        self._originals = []  # (class or job, attribute name, original function)
+        self._lock = threading.Lock()  # jobs may run on the async thread
+
+    def enable(self, modules, command_base, listener_bases, jobs=(), samples_path=None):
+        """wrap the commands and listeners defined in modules, and the jobs"""
+        self.disable()
+        if samples_path:
+            self.samples = open(samples_path, "a", encoding="utf-8")
+        for module in modules:
+            for cls in vars(module).values():
+                if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                    continue
+                if issubclass(cls, command_base):
+                    names = [n for n in self.COMMAND_METHODS if n in vars(cls)]
+                elif issubclass(cls, listener_bases):
+                    names = [n for n in vars(cls) if n.startswith(self.LISTENER_PREFIX)
+                             and callable(vars(cls)[n])]
+                else:
+                    continue
+                for name in names:
+                    original = vars(cls)[name]
+                    self._originals.append((cls, name, original))
+                    setattr(cls, name, self._wrap(name, original))
+        for job in jobs:
+            self._originals.append((job, "callback", job.callback))
+            job.callback = self._wrap_job(job.name, job.callback)
+        self.enabled = True
+
+    def disable(self):
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        if self.samples is not None:
+            self.samples.close()
+            self.samples = None
+        self.enabled = False
+
+    def reset(self):
+        self.histograms.clear()
+
+    def _wrap(self, name, func):
+        instrumentation = self
+
+        @functools.wraps(func)
+        def timed(self, *args, **kwargs):
+            start = instrumentation.clock()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                elapsed = instrumentation.clock() - start
+                instrumentation.record("%s.%s" % (type(self).__name__, name),
+                                       elapsed, buffer_size(self, args))
+        timed.instrumented = func
+        return timed
+
+    def _wrap_job(self, name, func):
+        def timed(task):
+            start = self.clock()
+            try:
+                return func(task)
+            finally:
+                self.record("scheduler.%s" % name, self.clock() - start,
+                            buffer_size(None, task.args))
+        return timed
+
+    def record(self, key, seconds, size=None):
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.add(seconds, size)
+            if self.samples is not None:
+                self.samples.write(json.dumps({"time": time.time(), "name": key,
+                                               "ms": seconds * 1000, "size": size}) + "\n")
+
+    def report(self):
+        """a table of the call counts and latency percentiles, slowest p99 first"""
+        lines = ["%-48s %8s %9s %9s %9s %9s %10s" % (
+            "command / callback", "calls", "p50 ms", "p95 ms", "p99 ms", "max ms", "max size")]
+        rows = sorted(self.histograms.items(), key=lambda item: -item[1].percentile(99))
+        for key, h in rows:
+            lines.append("%-48s %8d %9.3f %9.3f %9.3f %9.3f %10d" % (
+                key, h.count, h.percentile(50) * 1000, h.percentile(95) * 1000,
+                h.percentile(99) * 1000, h.max * 1000, h.max_size))
+        if not rows:
+            lines.append("(nothing recorded yet)")
+        return "\n".join(lines)
+
+
+def buffer_size(listener, args):
+    """size of the buffer a command or listener call is about, if any"""
+    view = getattr(listener, "view", None)
+    if view is None:
+        buffer = getattr(listener, "buffer", None)
+        if buffer is not None:
+            view = buffer.primary_view()
+        elif args and hasattr(args[0], "size"):
+            view = args[0]
+    try:
+        return view.size() if view is not None else None
+    except Exception:
+        return None
@@ -0,0 +1,168 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Job(object):
+    """
+    Some work a feature registers with the scheduler: its callback gets the
+    ScheduledTask, with the args it was scheduled with in task.args.
+    Higher priority jobs run first; delay (ms) debounces the scheduling.
+    """
+    __slots__ = ("name", "callback", "priority", "delay", "run_async")
+
+    def __init__(self, name, callback, priority=0, delay=0, run_async=False):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.delay = delay
+        self.run_async = run_async
+
+
+class ScheduledTask(object):
+    """
+    One run of a job for one buffer (or view). A task scheduled for a given
+    change_count is cancelled as soon as the buffer moves past it; long
+    running callbacks should poll task.cancelled().
+    """
+    __slots__ = ("scheduler", "job", "key", "change_count", "args", "_cancelled")
+
+    def __init__(self, scheduler, job, key, change_count, args):
+        self.scheduler = scheduler
+        self.job = job
+        self.key = key
+        self.change_count = change_count
+        self.args = args
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def cancelled(self):
+        if self._cancelled:
+            return True
+        if self.change_count is None:
+            return False
+        latest = self.scheduler.change_counts.get(self.key)
+        return latest is not None and latest != self.change_count
+
+
+class BufferScheduler(object):
+    """
+    Central scheduler for the per-buffer work of the plugin, so that bursts
+    of events don't pile work up:
+
+    - a job is scheduled at most once per key: scheduling it again before it
+      ran supersedes (cancels) the pending task and restarts its delay, so
+      a burst of edits runs it once, after the burst;
+    - tasks bound to a change_count are dropped (or told to stop, if
+      running) once advance() reports the buffer changed;
+    - due tasks run by priority on the main thread, or are handed to the
+      async thread, and the main thread gives up after budget ms of work
+      to come back for the rest on the next tick.
+
+    set_timeout and set_timeout_async are sublime's (or stand-ins), so that
+    this module can run outside the editor.
+    """
+
+    def __init__(self, set_timeout, set_timeout_async=None, budget=8, clock=time.perf_counter):
+        self.set_timeout = set_timeout
+        self.set_timeout_async = set_timeout_async or set_timeout
+        self.budget = budget
+        self.clock = clock
+        self.jobs = {}
+        self.pending = {}        # (job name, key) -> task waiting for its delay
+        self.running = {}        # (job name, key) -> task running on the async thread
+        self.change_counts = {}  # key -> latest change_count reported by advance()
+        self._ready = []         # heap of (-priority, seq, task)
+        self._seq = itertools.count()
+        self._draining = False
+        self._lock = threading.Lock()
+
+    def register(self, name, callback, priority=0, delay=0, run_async=False):
+        job = self.jobs[name] = Job(name, callback, priority, delay, run_async)
+        return job
+
+    def schedule(self, name, key, change_count=None, *args):
+        """
+        Schedule job name for key, superseding the one already pending.
+        If the very same run (same change_count) is already pending or
+        running, that task is returned instead.
+        """
+        job = self.jobs[name]
+        slot = (name, key)
+        with self._lock:
+            if change_count is not None:
+                # advance() may not have been told of edits made while key had no work
+                self.change_counts[key] = change_count
+            for current in (self.running.get(slot), self.pending.get(slot)):
+                if (current is not None and change_count is not None
+                        and current.change_count == change_count and not current.cancelled()):
+                    return current
+            previous = self.pending.get(slot)
+            if previous is not None:
+                previous.cancel()
+            task = self.pending[slot] = ScheduledTask(self, job, key, change_count, args)
+        self.set_timeout(lambda: self._due(task), job.delay)
+        return task
+
+    def busy(self, name, key):
+        """is job name pending or running for key"""
+        slot = (name, key)
+        return slot in self.pending or slot in self.running
+
+    def advance(self, key, change_count):
+        """the buffer key is now at change_count: cancel what was meant for before"""
+        self.change_counts[key] = change_count
+
+    def cancel(self, key, name=None):
+        """cancel the pending and running tasks of key (for job name only, if given)"""
+        with self._lock:
+            for tasks in (self.pending, self.running):
+                for slot in [slot for slot in tasks if slot[1] == key and name in (None, slot[0])]:
+                    tasks.pop(slot).cancel()
+
+    def _due(self, task):
+        slot = (task.job.name, task.key)
+        with self._lock:
+            if self.pending.get(slot) is task:
+                del self.pending[slot]
+        if task.cancelled():
+            return
+        heapq.heappush(self._ready, (-task.job.priority, next(self._seq), task))
+        if not self._draining:
+            self._drain()
+
+    def _drain(self):
+        self._draining = True
+        start = self.clock()
+        try:
+            while self._ready:
+                if (self.clock() - start) * 1000 >= self.budget:
+                    # out of budget for this tick: let the UI breathe, then go on
+                    self.set_timeout(self._drain, 0)
+                    start = None
+                    return
+                task = heapq.heappop(self._ready)[2]
+                if task.cancelled():
+                    continue
+                if task.job.run_async:
+                    with self._lock:
+                        self.running[(task.job.name, task.key)] = task
+                    self.set_timeout_async(lambda task=task: self._run(task), 0)
+                else:
+                    self._run(task)
+        finally:
+            if start is not None:
+                self._draining = False
+
+    def _run(self, task):
+        try:
+            if not task.cancelled():
+                task.job.callback(task)
+        finally:
+            slot = (task.job.name, task.key)
+            with self._lock:
+                if self.running.get(slot) is task:
+                    del self.running[slot]
@@ -0,0 +1,899 @@
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+from ..wcwidth import wcwidth
+
+
+def line_is_separator(line):
+    return re.match('^[\t +=-]+$', line)
+
+
+def has_line_seps(raw_lines):
+    for line in raw_lines:
+        if line_is_separator(line):
+            return True
+    return False
+
+
+def partition_raw_lines(raw_lines):
+    """Partitions a list of raw input lines so that between each partition, a
+    table row separator can be placed.
+
+    """
+    if not has_line_seps(raw_lines):
+        return [[x] for x in raw_lines]
+
+    curr_part = []
+    parts = [curr_part]
+    for line in raw_lines:
+        if line_is_separator(line):
+            curr_part = []
+            parts.append(curr_part)
+        else:
+            curr_part.append(line)
+
+    # remove any empty partitions (typically the first and last ones)
+    return [x for x in parts if x]
+
+
+def split_table_row(row_string):
+    if row_string.find("|") >= 0:
+        # first, strip off the outer table drawings
+        row_string = re.sub(r'^\s*\||\|\s*$', '', row_string)
+        return re.split(r'\s*\|\s*', row_string.strip())
+    return re.split(r'\s\s+', row_string.rstrip())
+
+
+def is_grid_table(raw_lines):
+    """whether the block starts with the top border of a grid table"""
+    for line in raw_lines:
+        line = line.strip()
+        if line:
+            return line.startswith('+') and '-' in line and line_is_separator(line) is not None
+    return False
+
+
+def table_line(widths, header=False):
+    if header:
+        linechar = '='
+    else:
+        linechar = '-'
+    sep = '+'
+    parts = []
+    for width in widths:
+        parts.append(linechar * width)
+    if parts:
+        parts = [''] + parts + ['']
+    return sep.join(parts)
+
+
+class GridTableError(Exception):
+    pass
+
+
+# where the rows and columns of a parsed grid table were: the lines of the
+# top borders, the display columns of the left borders, the size of the
+# grid and the indentation of the block it was read from, and the widths
+# of the columns as drawn by their borders (whatever text overruns them)
+GridLayout = namedtuple('GridLayout', "tops lefts height width indent widths")
+
+
+def display_columns(line):
+    """
+    line indexable by display column: ASCII lines as they are, others as
+    lists with one entry per column, where a wide character is followed by
+    an empty entry and combining characters go with the one they follow
+    (so look entries up in tuples, not strings: '' is in any string)
+    """
+    if line.isascii():
+        return line
+    columns = []
+    for char in line:
+        width = wcwidth.wcswidth(char)
+        if width == 0 and columns:
+            columns[-1] += char
+        elif width == 2:
+            columns += char, ''
+        else:
+            columns.append(char)
+    return columns
+
+
+def is_border(line, begin, end, chars):
+    """whether line[begin:end] is made of chars only"""
+    segment = line[begin:end]
+    if not isinstance(segment, str):
+        # wide characters, with their '' entries, make it shorter
+        segment = ''.join(segment)
+    return len(segment) == end - begin and not segment.strip(chars)
+
+
+def cell_lines(grid, top, left, bottom, right):
+    """the text inside a cell, dedented, without its blank first and last lines"""
+    if bottom - top == 2:
+        text = grid[top + 1][left + 1:right]
+        return [(text if isinstance(text, str) else ''.join(text)).strip()]
+    lines = [''.join(grid[y][left + 1:right]).rstrip() for y in range(top + 1, bottom)]
+    while lines and not lines[-1]:
+        lines.pop()
+    while lines and not lines[0]:
+        del lines[0]
+    if not lines:
+        return ['']
+    dedent = min(len(line) - len(line.lstrip()) for line in lines if line)
+    return [line[dedent:] for line in lines]
+
+
+def regular_cells(grid):
+    """
+    scan_grid's cells of a grid without merged cells, found line by line,
+    or None if the grid has some
+    """
+    top_border = grid[0]
+    if not isinstance(top_border, str):
+        return None
+    corners = [x for x, char in enumerate(top_border) if char == '+']
+    separators = (top_border, top_border.replace('-', '='))
+    cells = []
+    top = 0
+    for y in range(1, len(grid)):
+        line = grid[y]
+        if line in separators:
+            for left, right in zip(corners, corners[1:]):
+                cells.append((top, left, y, right, cell_lines(grid, top, left, y, right)))
+            top = y
+        elif any(line[x] != '|' for x in corners):
+            return None
+    return cells if top == len(grid) - 1 else None
+
+
+def align_borders(bars, candidates, below=None, mergeable=None):
+    """
+    pairs (i, j) matching the borders at bars[i] on a line to those at
+    candidates[j] on the line above, first to first and last to last, in
+    order: going on down to the borders below if given (those of the line
+    with the bottom border of the row), where the fewest cells between
+    them differ in width, and then by the fewest columns (an edit usually
+    changes one cell). Borders above may be left out (a merged cell below)
+    if they are in mergeable (or any, if it is None), those of the line
+    too, as if changed (a '|' or '+' in the text). None if there is no
+    such match.
+    """
+    best = {(0, 0): ((0, 0, 0), None)}
+    for i in range(1, len(bars)):
+        for j in range(1, len(candidates)):
+            choice = None
+            for i0 in range(max(i - 2, 0), i):
+                for j0 in range(j - 1, -1, -1):
+                    if j0 < j - 1 and mergeable is not None and candidates[j0 + 1] not in mergeable:
+                        break
+                    previous = best.get((i0, j0))
+                    if previous is None:
+                        continue
+                    (astray, changed, difference), _ = previous
+                    extra = abs((bars[i] - bars[i0]) - (candidates[j] - candidates[j0]))
+                    cost = (astray + (below is not None and candidates[j] not in below),
+                            changed + i - i0 - 1 + (extra > 0), difference + extra)
+                    if choice is None or cost < choice[0]:
+                        choice = cost, (i0, j0)
+            if choice is not None:
+                best[(i, j)] = choice
+    pair = len(bars) - 1, len(candidates) - 1
+    if pair not in best:
+        return None
+    pairs = []
+    while pair is not None:
+        pairs.append(pair)
+        pair = best[pair][1]
+    pairs.reverse()
+    return pairs
+
+
+def widen(line, x, count):
+    """inserts count columns in line before its first border from x on"""
+    border = x
+    while border < len(line) and line[border] not in ('|', '+'):
+        border += 1
+    fill = line[border - 1] if 0 < border <= len(line) and line[border - 1] in ('-', '=') else ' '
+    line[border:border] = [fill] * count
+
+
+BORDER_SEGMENT = re.compile(r'\+[-=]|[-=]\+')
+
+
+def realign_grid(grid):
+    """
+    grid with the borders of the text lines whose text has grown past
+    them, or shrunk away from them, back in line with those of the line
+    above, top to bottom: the text that has grown widens its columns on the
+    other lines, the text that has shrunk is padded. The lines below get
+    the columns widened as the lines above; lines with horizontal borders
+    are taken as they are, text lines that then don't line up are matched
+    to the line above from scratch (see align_borders), leaving out only
+    the borders whose corner the horizontal borders of the row leave out.
+    Also returns, per display column, whether it was added. Raises
+    GridTableError if the borders of a line can't be matched to those above.
+    """
+    grid = [list(line) for line in grid]
+    for line in grid:
+        while line and line[-1] == ' ':
+            line.pop()
+    added = [False] * max(len(line) for line in grid)
+    widened = []  # (x, count) of the columns added, in turn
+
+    def borders(line):
+        return [x for x, char in enumerate(line) if char in ('|', '+')]
+
+    def lined_up(bars, candidates):
+        return bars and bars[-1] == candidates[-1] and set(bars) <= set(candidates)
+
+    def widened_line(y):
+        line = grid[y][:]
+        for x, count in widened:
+            widen(line, x, count)
+        return line
+
+    def is_border_line(line):
+        return BORDER_SEGMENT.search(''.join(line)) is not None
+
+    candidates = borders(grid[0])
+    for y in range(1, len(grid)):
+        line = widened_line(y)
+        bars = borders(line)
+        if is_border_line(line) or lined_up(bars, candidates):
+            grid[y] = line
+            candidates = bars
+            continue
+        line = grid[y]
+        bars = borders(line)
+        if not bars or bars[0] != 0 or not candidates:
+            raise GridTableError('no border at the start of line %d' % (y + 1))
+        # a border above may only be left out where the horizontal
+        # borders of the row leave out its corner, a merged cell
+        above = next(borders(grid[y0]) for y0 in range(y - 1, -1, -1) if is_border_line(grid[y0]))
+        below = None
+        for y1 in range(y + 1, len(grid)):
+            next_line = widened_line(y1)
+            if is_border_line(next_line):
+                below = set(borders(next_line))
+                break
+        mergeable = {x for x in candidates if x not in above or (below is not None and x not in below)}
+        pairs = align_borders(bars, candidates, below, mergeable)
+        if pairs is None:
+            raise GridTableError('the borders of line %d do not match those above' % (y + 1))
+        for (i0, j0), (i, j) in zip(pairs, pairs[1:]):
+            extra = (bars[i] - bars[i0]) - (candidates[j] - candidates[j0])
+            if extra > 0:
+                for above in grid[:y]:
+                    widen(above, candidates[j], extra)
+                widened.append((candidates[j], extra))
+                added[candidates[j]:candidates[j]] = [True] * extra
+                candidates[j:] = [x + extra for x in candidates[j:]]
+            elif extra < 0:
+                line[bars[i]:bars[i]] = [' '] * -extra
+                bars[i:] = [x - extra for x in bars[i:]]
+        candidates = borders(line)
+    for y, line in enumerate(grid):
+        text = ''.join(line)
+        if len(text) == len(line):
+            # one character per column, as display_columns gives them
+            grid[y] = text
+    return grid, added
+
+
+def scan_cells(grid, height, width):
+    """cells and header separator of scan_grid, in a grid of lines padded to width"""
+
+    def closes(top, left, bottom, right):
+        line = grid[bottom]
+        return (line[left] == '+' and is_border(line, left + 1, right, '-=+')
+                and all(grid[y][left] in ('|', '+') for y in range(top + 1, bottom)))
+
+    def scan_cell(top, left):
+        line = grid[top]
+        corner = left
+        while True:
+            try:
+                right = line.index('+', corner + 1)
+            except ValueError:
+                break
+            if not is_border(line, corner + 1, right, '-='):
+                break
+            for bottom in range(top + 1, height):
+                char = grid[bottom][right]
+                if char == '+':
+                    if closes(top, left, bottom, right):
+                        return bottom, right
+                elif char != '|':
+                    break
+            corner = right
+        raise GridTableError('no cell at line %d, column %d' % (top + 1, left + 1))
+
+    if grid[0][0] != '+':
+        raise GridTableError('no top left corner')
+    cells = regular_cells(grid)
+    if cells is not None:
+        header = None
+        for y, line in enumerate(grid):
+            if line[1] == '=':
+                header = y
+        return cells, header
+    cells = []
+    header = None
+    area = 0
+    corners = [(0, 0)]
+    seen = {(0, 0)}
+    while corners:
+        top, left = corners.pop()
+        bottom, right = scan_cell(top, left)
+        cells.append((top, left, bottom, right, cell_lines(grid, top, left, bottom, right)))
+        area += (bottom - top) * (right - left)
+        if grid[bottom][left + 1] == '=':
+            header = bottom
+        for y, x in ((top, right), (bottom, left)):
+            if y < height - 1 and x < width - 1 and (y, x) not in seen \
+                    and grid[y][x + 1] in ('-', '=') and grid[y + 1][x] in ('|', '+'):
+                seen.add((y, x))
+                corners.append((y, x))
+    if area != (height - 1) * (width - 1):
+        raise GridTableError('the cells do not cover the table')
+    return cells, header
+
+
+def pad_grid(grid):
+    width = max(len(line) for line in grid)
+    for y, line in enumerate(grid):
+        if len(line) < width:
+            grid[y] = line + ' ' * (width - len(line)) if isinstance(line, str) else line + [' '] * (width - len(line))
+    return width
+
+
+def scan_grid(raw_lines):
+    """
+    Cells of a grid table, as (top, left, bottom, right, lines) with the
+    coordinates of their borders in lines and display columns of the block,
+    found from the top left corner of each cell: along its top border to
+    the first corner from which a right border goes down to a corner with a
+    bottom border back to the left one. The top left corners of the other
+    cells are the top right and bottom left corners of those found, where
+    borders go right and down, so every corner is looked at once, and every
+    border character about twice.
+
+    If the borders don't close, the grid is realigned first (see
+    realign_grid), for the text of a cell grown past its border. Lines
+    below the bottom border are a row added, closed by a border alike.
+
+    Also returns the line of the header separator (or None), the height,
+    width and indentation of the grid, and per display column whether it
+    was added by the realignment (or None if there was none). Raises
+    GridTableError if the borders don't close into rectangles covering
+    the whole table, realigned or not.
+    """
+    lines = [line.rstrip() for line in raw_lines if line.strip()]
+    if not lines:
+        raise GridTableError('empty table')
+    last_border = max((y for y, line in enumerate(lines) if line_is_separator(line)), default=None)
+    if last_border is not None and last_border < len(lines) - 1:
+        # a row added below the bottom border: close it with a border alike
+        lines.append(lines[last_border].replace('=', '-'))
+    indent = min(len(line) - len(line.lstrip()) for line in lines)
+    grid = [display_columns(line[indent:]) for line in lines]
+    height = len(grid)
+    width = pad_grid(grid)
+    try:
+        cells, header = scan_cells(grid, height, width)
+        return cells, header, height, width, indent, None
+    except GridTableError:
+        grid, added = realign_grid(grid)
+    width = pad_grid(grid)
+    added += [False] * (width - len(added))
+    cells, header = scan_cells(grid, height, width)
+    return cells, header, height, width, indent, added
+
+
+def word_width(word, cache):
+    """display width of a word, measured once and kept in cache"""
+    width = cache.get(word)
+    if width is None:
+        width = len(word) if word.isascii() else wcwidth.wcswidth(word)
+        if width < 0:
+            # control characters: one column each, as the grid scan reads them
+            width = len(display_columns(word))
+        cache[word] = width
+    return width
+
+
+def break_word(word, width, cache):
+    """
+    pieces of a word wider than width, each as wide as width at most, and
+    their widths, kept in cache
+    """
+    key = word, width
+    pieces = cache.get(key)
+    if pieces is not None:
+        return pieces
+    pieces = []
+    piece, used = '', 0
+    for char in word:
+        char_width = 1 if char.isascii() else max(wcwidth.wcwidth(char), 0)
+        if used + char_width > width and piece:
+            pieces.append((piece, used))
+            piece, used = '', 0
+        piece += char
+        used += char_width
+    pieces.append((piece, used))
+    cache[key] = pieces
+    return pieces
+
+
+def wrap(text, width, cache, balanced=False):
+    """
+    lines of the words of text, at most width display columns wide, and
+    their widths: the words measured once (see word_width), words wider
+    than a line broken into pieces that fill it, and the line breaks found
+    in a single pass, filling each line in turn, or, if balanced, where the
+    sum of the squares of the room left at the end of the lines but the
+    last is the smallest (minimum raggedness).
+    """
+    width = max(width, 1)
+    words = text.split()
+    if not words:
+        return [''], [0]
+    get = cache.get
+    widths = [get(word) for word in words]
+    if None in widths:
+        widths = [word_width(word, cache) for word in words]
+    if sum(widths) + len(words) - 1 <= width:
+        # fits on one line, the common case
+        return [' '.join(words)], [sum(widths) + len(words) - 1]
+    if max(widths) > width:
+        measured, words, widths = zip(words, widths), [], []
+        for word, word_columns in measured:
+            if word_columns > width:
+                for piece, piece_columns in break_word(word, width, cache):
+                    words.append(piece)
+                    widths.append(piece_columns)
+            else:
+                words.append(word)
+                widths.append(word_columns)
+    if balanced:
+        return _wrap_balanced(words, widths, width)
+    lines, line_widths = [], []
+    first, used = 0, widths[0]
+    for i in range(1, len(words)):
+        if used + 1 + widths[i] > width:
+            lines.append(' '.join(words[first:i]))
+            line_widths.append(used)
+            first, used = i, widths[i]
+        else:
+            used += 1 + widths[i]
+    lines.append(' '.join(words[first:]))
+    line_widths.append(used)
+    return lines, line_widths
+
+
+def _wrap_balanced(words, widths, width):
+    count = len(words)
+    # cost[j]: raggedness of the best lines of words[:j], first[j]: where
+    # the last of them starts
+    cost = [0] + [None] * count
+    first = [0] * (count + 1)
+    for end in range(1, count + 1):
+        used = -1
+        for start in range(end - 1, -1, -1):
+            used += widths[start] + 1
+            if used > width and start < end - 1:
+                break
+            line_cost = cost[start] + (0 if end == count else (width - used) ** 2)
+            if cost[end] is None or line_cost < cost[end]:
+                cost[end], first[end] = line_cost, start
+    bounds = []
+    end = count
+    while end:
+        bounds.append((first[end], end))
+        end = first[end]
+    bounds.reverse()
+    return ([' '.join(words[start:end]) for start, end in bounds],
+            [sum(widths[start:end]) + end - start - 1 for start, end in bounds])
+
+
+class TableColumn(object):
+    """
+    The cells of one table column, top to bottom: each as the list of its
+    lines, with the display width of every line measured once, when the
+    cell is added.
+    """
+    __slots__ = ('cells', 'widths', 'width')
+
+    def __init__(self):
+        self.cells = []   # per row, the lines of the cell
+        self.widths = []  # per row, the display widths of those lines
+        self.width = 0    # widest line of the column, cells spanning columns aside
+
+    def append(self, lines, spanning=False, widths=None):
+        if widths is None:
+            widths = [wcwidth.wcswidth(line) for line in lines]
+        self.cells.append(lines)
+        self.widths.append(widths)
+        if not spanning:
+            self.width = max(self.width, max(widths))
+
+    def set(self, row, lines):
+        """replaces the lines of a cell, leaving width to measure()"""
+        self.cells[row] = lines
+        self.widths[row] = [wcwidth.wcswidth(line) for line in lines]
+
+    def measure(self, spanning=()):
+        """works width out again, leaving out the rows of spanning"""
+        self.width = max((max(widths) for r, widths in enumerate(self.widths) if r not in spanning), default=0)
+
+
+class Table(object):
+    """
+    A reSt table stored column by column, parsed once from the raw lines
+    of the block and rendered from there: the widths come from the cached
+    ones of the columns, and the whole table is emitted with a single join.
+
+    A merged cell is stored in the row and column of its top left corner,
+    with the number of rows and columns it spans in spans, the cells it
+    covers being left empty. The first header_rows rows are the header.
+    Cells are merged and split in place, see merge() and split().
+    """
+
+    def __init__(self, columns, num_rows, spans=None, header_rows=1, layout=None):
+        self.columns = columns
+        self.num_rows = num_rows
+        self.spans = spans or {}  # (row, column) -> (rows, columns)
+        self.header_rows = header_rows
+        # GridLayout of the grid table parsed, if it was one
+        self.layout = layout
+
+    @property
+    def grid_widths(self):
+        """column widths of the grid table parsed, if it was one"""
+        return self.layout.widths if self.layout is not None else None
+
+    @classmethod
+    def parse(cls, raw_lines):
+        """
+        table of the raw lines of a block: a grid table, merged cells
+        included, or, failing that, read line by line (see parse_lines)
+        """
+        if is_grid_table(raw_lines):
+            try:
+                return cls.parse_grid(raw_lines)
+            except GridTableError:
+                pass
+        return cls.parse_lines(raw_lines)
+
+    @classmethod
+    def parse_lines(cls, raw_lines):
+        """
+        table of columns separated by bars or by two spaces or more, one
+        row per line or per group of lines between separators. Columns
+        empty in every row are dropped. The borders of merged cells are
+        taken for text.
+        """
+        rows = []
+        filled = set()  # columns with some text
+        for part in partition_raw_lines(raw_lines):
+            row = []
+            for raw_line in part:
+                fields = split_table_row(raw_line)
+                if len(fields) > len(row):
+                    row.extend([] for _ in range(len(fields) - len(row)))
+                for i, field in enumerate(fields):
+                    text = field.strip()
+                    if text:
+                        row[i].append(text)
+                        filled.add(i)
+            rows.append(row)
+        columns = []
+        for i in sorted(filled):
+            column = TableColumn()
+            for row in rows:
+                column.append(row[i] if i < len(row) and row[i] else [''])
+            columns.append(column)
+        return cls(columns, len(rows))
+
+    @classmethod
+    def parse_grid(cls, raw_lines):
+        """table of a grid table with its merged cells, see scan_grid"""
+        cells, header, height, width, indent, added = scan_grid(raw_lines)
+        tops = sorted({cell[0] for cell in cells})
+        lefts = sorted({cell[1] for cell in cells})
+        row_of = {y: r for r, y in enumerate(tops + [height - 1])}
+        column_of = {x: c for c, x in enumerate(lefts + [width - 1])}
+        num_rows, num_columns = len(tops), len(lefts)
+
+        slots = [[None] * num_rows for _ in range(num_columns)]
+        spans = {}
+        for top, left, bottom, right, lines in cells:
+            r, c = row_of[top], column_of[left]
+            try:
+                span = row_of[bottom] - r, column_of[right] - c
+            except KeyError:
+                raise GridTableError('cell borders off the grid')
+            if span != (1, 1):
+                spans[(r, c)] = span
+            slots[c][r] = lines
+        columns = []
+        for c, column_slots in enumerate(slots):
+            column = TableColumn()
+            for r, lines in enumerate(column_slots):
+                span = spans.get((r, c))
+                column.append(lines or [''], spanning=span is not None and span[1] > 1)
+            columns.append(column)
+        header_rows = row_of[header] if header is not None else 0
+        widths = []
+        for left, right in zip(lefts, lefts[1:] + [width - 1]):
+            widths.append(right - left - 3 - (sum(added[left + 1:right]) if added else 0))
+        return cls(columns, num_rows, spans, header_rows, GridLayout(tops, lefts, height, width, indent, widths))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """table of rows of field texts, with their lines separated by newlines"""
+        num_columns = max(len(row) for row in rows) if rows else 0
+        columns = [TableColumn() for _ in range(num_columns)]
+        for row in rows:
+            for i, column in enumerate(columns):
+                column.append([line.strip() for line in row[i].split('\n')] if i < len(row) else [''])
+        return cls(columns, len(rows))
+
+    def rows(self):
+        """the field texts of every row, lines separated by newlines"""
+        return [['\n'.join(column.cells[r]) for column in self.columns]
+                for r in range(self.num_rows)]
+
+    def widths(self, at_least=None):
+        """
+        the width of each column: its widest line, or the width given in
+        at_least if wider, widened where a merged cell doesn't fit in the
+        columns it spans (the last one taking the difference)
+        """
+        widths = [column.width for column in self.columns]
+        if at_least:
+            widths = [max(pair) for pair in zip(widths, at_least)]
+        for (r, c), (_, num_columns) in sorted(self.spans.items(), key=lambda item: (item[1][1], item[0][1], item[0][0])):
+            if num_columns > 1:
+                missing = max(self.columns[c].widths[r]) - self.span_width(widths, c, num_columns)
+                if missing > 0:
+                    widths[c + num_columns - 1] += missing
+        return widths
+
+    @staticmethod
+    def span_width(widths, column, num_columns):
+        """room for text in a cell spanning num_columns columns from column"""
+        return sum(widths[column:column + num_columns]) + 3 * (num_columns - 1)
+
+    def heights(self):
+        """
+        the number of lines of each row, those of a merged cell that don't
+        fit in the rows it spans going to the last one
+        """
+        spans = self.spans
+        heights = []
+        for r in range(self.num_rows):
+            heights.append(max((len(column.cells[r]) for c, column in enumerate(self.columns)
+                                if (r, c) not in spans or spans[(r, c)][0] == 1), default=1))
+        for (r, c), (num_rows, _) in self.spans.items():
+            if num_rows > 1:
+                missing = len(self.columns[c].cells[r]) - sum(heights[r:r + num_rows]) - (num_rows - 1)
+                if missing > 0:
+                    heights[r + num_rows - 1] += missing
+        return heights
+
+    def owners(self):
+        """per row, the (row, column) of the cell covering each column"""
+        owners = [[(r, c) for c in range(len(self.columns))] for r in range(self.num_rows)]
+        for (r, c), (num_rows, num_columns) in self.spans.items():
+            for row in owners[r:r + num_rows]:
+                row[c:c + num_columns] = [(r, c)] * num_columns
+        return owners
+
+    def cell_at(self, y, line, column):
+        """
+        (row, column) of the slot under the character column of line, line y
+        of the block the grid table was parsed from; borders go with the
+        cells below and to the right of them
+        """
+        layout = self.layout
+        x = len(display_columns(line[layout.indent:column])) if column > layout.indent else 0
+        row = bisect_right(layout.tops, y) - 1
+        col = bisect_right(layout.lefts, x) - 1
+        return min(max(row, 0), self.num_rows - 1), min(max(col, 0), len(self.columns) - 1)
+
+    def covering(self, top, left, bottom, right):
+        """
+        the smallest rectangle of rows and columns, as (top, left, bottom,
+        right) bounds included, holding the one given and not cut through
+        by a merged cell
+        """
+        changed = True
+        while changed:
+            changed = False
+            for (r, c), (num_rows, num_columns) in self.spans.items():
+                last_row, last_column = r + num_rows - 1, c + num_columns - 1
+                if r <= bottom and last_row >= top and c <= right and last_column >= left \
+                        and not (top <= r and last_row <= bottom and left <= c and last_column <= right):
+                    top, left = min(top, r), min(left, c)
+                    bottom, right = max(bottom, last_row), max(right, last_column)
+                    changed = True
+        return top, left, bottom, right
+
+    def merge(self, top, left, bottom, right):
+        """
+        merges the cells of a rectangle of rows and columns, bounds included
+        and widened to the merged cells it cuts through, into one, as if the
+        borders inside were rubbed out: the text stays on the lines it was
+        drawn on, lines side by side joined with a space, the separators
+        between rows left as blank lines. Returns whether anything changed,
+        raises ValueError if the rectangle crosses the header separator.
+        """
+        top, left, bottom, right = self.covering(top, left, bottom, right)
+        span = bottom - top + 1, right - left + 1
+        if span == (1, 1) or self.spans.get((top, left)) == span:
+            return False
+        if top < self.header_rows <= bottom:
+            raise ValueError('cells cannot be merged across the header separator')
+        owners = self.owners()
+        # first line of each row, from that of the rectangle
+        tops = {top: 0}
+        for r, height in enumerate(self.heights()[top:bottom], top):
+            tops[r + 1] = tops[r] + height + 1
+        texts = {}  # line -> texts on it, left to right
+        for c in range(left, right + 1):
+            for r in range(top, bottom + 1):
+                if owners[r][c] == (r, c):
+                    for i, text in enumerate(self.columns[c].cells[r]):
+                        if text:
+                            texts.setdefault(tops[r] + i, []).append(text)
+        lines = []
+        for y in sorted(texts):
+            if lines and y - 1 not in texts:
+                lines.append('')
+            lines.append(' '.join(texts[y]))
+        for anchor in [(r, c) for r, c in self.spans if top <= r <= bottom and left <= c <= right]:
+            del self.spans[anchor]
+        for column in self.columns[left:right + 1]:
+            for r in range(top, bottom + 1):
+                column.set(r, [''])
+        self.columns[left].set(top, lines or [''])
+        self.spans[(top, left)] = span
+        self._measure(range(left, right + 1))
+        return True
+
+    def split(self, top, left, bottom, right):
+        """
+        splits the merged cells overlapping a rectangle of rows and columns,
+        bounds included, back into single cells, their text staying in the
+        top left one. Returns whether anything changed.
+        """
+        anchors = [(r, c) for (r, c), (num_rows, num_columns) in self.spans.items()
+                   if r <= bottom and r + num_rows > top and c <= right and c + num_columns > left]
+        for anchor in anchors:
+            del self.spans[anchor]
+        self._measure(sorted({c for _, c in anchors}))
+        return bool(anchors)
+
+    def _measure(self, columns):
+        for c in columns:
+            self.columns[c].measure({r for (r, first), (_, num_columns) in self.spans.items()
+                                     if first == c and num_columns > 1})
+
+    def reflow(self, widths, balanced=False):
+        """
+        new table with the text of each cell wrapped to the widths given,
+        in display columns, see wrap()
+        """
+        columns = []
+        cache = {}
+        for c, (column, width) in enumerate(zip(self.columns, widths)):
+            reflowed = TableColumn()
+            for r, lines in enumerate(column.cells):
+                span = self.spans.get((r, c), (1, 1))
+                span_width = self.span_width(widths, c, span[1]) if span[1] > 1 else width
+                lines, line_widths = wrap(' '.join(lines), span_width, cache, balanced)
+                reflowed.append(lines, span[1] > 1, line_widths)
+            columns.append(reflowed)
+        return Table(columns, self.num_rows, dict(self.spans), self.header_rows, self.layout)
+
+    def render(self, indent='', widths=None):
+        """text of the table drawn as a grid table, each line ending with a newline"""
+        if not self.num_rows:
+            return ''
+        if widths is None:
+            widths = self.widths()
+        num_rows, num_columns = self.num_rows, len(self.columns)
+        columns, spans = self.columns, self.spans
+        heights = self.heights()
+        owners = self.owners() if spans else None
+        # Reserve room for the spaces
+        sep_widths = [width + 2 for width in widths]
+        header_line = indent + table_line(sep_widths, header=True) + '\n'
+        normal_line = indent + table_line(sep_widths, header=False) + '\n'
+        # rows with a merged cell, whose separators have to be worked out
+        merged = set()
+        for (r, _), (rows, _) in spans.items():
+            merged.update(range(r, r + rows))
+        # first line of each row
+        tops = [1]
+        for height in heights:
+            tops.append(tops[-1] + height + 1)
+
+        parts = [normal_line]
+        for r in range(num_rows):
+            if r not in merged:
+                for i in range(heights[r]):
+                    parts.append(indent)
+                    for column, width in zip(columns, widths):
+                        lines = column.cells[r]
+                        if i < len(lines):
+                            parts += '| ', lines[i], ' ' * (width - column.widths[r][i]), ' '
+                        else:
+                            parts += '| ', ' ' * (width + 1)
+                    parts.append('|\n')
+            else:
+                row = owners[r]
+                for y in range(tops[r], tops[r] + heights[r]):
+                    parts.append(indent)
+                    c = 0
+                    while c < num_columns:
+                        cell_row = row[c][0]
+                        span = spans.get(row[c], (1, 1))[1]
+                        column = columns[c]
+                        lines = column.cells[cell_row]
+                        i = y - tops[cell_row]
+                        width = self.span_width(widths, c, span)
+                        if i < len(lines):
+                            parts += '| ', lines[i], ' ' * (width - column.widths[cell_row][i]), ' '
+                        else:
+                            parts += '| ', ' ' * (width + 1)
+                        c += span
+                    parts.append('|\n')
+            if r + 1 < num_rows and (r in merged or r + 1 in merged):
+                parts.append(self._separator(indent, r + 1, widths, owners, tops))
+            else:
+                parts.append(header_line if r + 1 == self.header_rows else normal_line)
+        return ''.join(parts)
+
+    def _separator(self, indent, r, widths, owners, tops):
+        """the line between rows r - 1 and r, crossed by the cells spanning both"""
+        char = '=' if r == self.header_rows else '-'
+        num_columns = len(self.columns)
+        above, below = owners[r - 1], owners[r]
+        y = tops[r] - 1
+
+        def vertical(row, c):
+            return c == 0 or c == num_columns or row[c - 1] != row[c]
+
+        parts = [indent]
+        c = 0
+        while c <= num_columns:
+            left = c > 0 and above[c - 1] != below[c - 1]
+            right = c < num_columns and above[c] != below[c]
+            if left or right:
+                parts.append('+' if vertical(above, c) or vertical(below, c) else char)
+            else:
+                parts.append('|' if vertical(above, c) or vertical(below, c) else ' ')
+            if c == num_columns:
+                break
+            if right:
+                parts.append(char * (widths[c] + 2))
+                c += 1
+                continue
+            # a cell spanning both rows: its text goes on
+            cell_row = above[c][0]
+            span = self.spans[above[c]][1]
+            column = self.columns[c]
+            lines = column.cells[cell_row]
+            i = y - tops[cell_row]
+            width = self.span_width(widths, c, span)
+            if i < len(lines):
+                parts += ' ', lines[i], ' ' * (width - column.widths[cell_row][i]), ' '
+            else:
+                parts.append(' ' * (width + 2))
+            c += span
+        parts.append('\n')
+        return ''.join(parts)
@@ -0,0 +1,202 @@
+"""
+Generates wcwidth/table_width.py, the width class of every code point as a
+two-level table of bytes (see wcwidth.py), from a local copy of the Unicode
+Character Database::
+
+    python wcwidth/update_tables.py --unicode-data UnicodeData.txt \\
+        --east-asian-width EastAsianWidth.txt
+
+Both files are at https://www.unicode.org/Public/<version>/ucd/. Without
+them, the data of the unicodedata module of the Python running the script
+is used instead, which is only as recent as that Python.
+
+The rules are those of wcwidth.py:
+
+    - NUL and the hand picked format characters of ZERO_WIDTH: 0 columns,
+    - C0 and C1 control characters: not printable,
+    - combining characters (general category Mn or Me, or a non-zero
+      canonical combining class): not printable on their own, 0 columns in
+      a string,
+    - East Asian Wide (W) and Fullwidth (F): 2 columns,
+    - everything else: 1 column.
+"""
+import argparse
+import os
+import sys
+
+# width classes, in the order of wcwidth.py
+NONPRINTABLE, ZERO, NARROW, WIDE, COMBINING = range(5)
+
+ZERO_WIDTH = (
+    (0x0000, 0x0000,),
+    (0x034f, 0x034f,),
+    (0x200b, 0x200f,),
+    (0x2028, 0x2029,),
+    (0x202a, 0x202e,),
+    (0x2060, 0x2063,),
+)
+
+CONTROL = (
+    (0x0001, 0x001f,),
+    (0x007f, 0x009f,),
+)
+
+# unlisted code points of these blocks default to W in EastAsianWidth.txt
+WIDE_BY_DEFAULT = (
+    (0x3400, 0x4dbf,),
+    (0x4e00, 0x9fff,),
+    (0xf900, 0xfaff,),
+    (0x20000, 0x2fffd,),
+    (0x30000, 0x3fffd,),
+)
+
+MAX_CODE_POINT = 0x10ffff
+TARGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wcwidth", "table_width.py")
+
+
+def parse_ranges(path):
+    """(start, end, fields) of each data line of a UCD file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            fields = [field.strip() for field in line.split(";")]
+            start, _, end = fields[0].partition("..")
+            yield int(start, 16), int(end or start, 16), fields[1:]
+
+
+def combining_from_file(path):
+    """code points of UnicodeData.txt that are combining characters"""
+    combining = []
+    first = None
+    for start, _, fields in parse_ranges(path):
+        name, category, ccc = fields[0], fields[1], fields[2]
+        if name.endswith(", First>"):
+            first = start
+            continue
+        begin = first if name.endswith(", Last>") else start
+        first = None
+        if category in ("Mn", "Me") or ccc != "0":
+            combining.append((begin, start))
+    return combining
+
+
+def wide_from_file(path):
+    wide = list(WIDE_BY_DEFAULT)
+    narrow = []
+    for start, end, fields in parse_ranges(path):
+        (wide if fields[0] in ("W", "F") else narrow).append((start, end))
+    # explicit entries override the block defaults
+    return wide, narrow
+
+
+def from_unicodedata():
+    import unicodedata
+    combining, wide = [], list(WIDE_BY_DEFAULT)
+    for ucs in range(MAX_CODE_POINT + 1):
+        char = chr(ucs)
+        category = unicodedata.category(char)
+        if category == "Cn":
+            # east_asian_width() of unassigned code points is always F
+            continue
+        if category in ("Mn", "Me") or unicodedata.combining(char):
+            combining.append((ucs, ucs))
+        if unicodedata.east_asian_width(char) in ("W", "F"):
+            wide.append((ucs, ucs))
+    source = "unicodedata module of Python %s" % sys.version.split()[0]
+    return unicodedata.unidata_version, source, combining, wide, []
+
+
+def width_classes(combining, wide, narrow):
+    classes = bytearray([NARROW]) * (MAX_CODE_POINT + 1)
+    # lowest precedence first, as later ranges overwrite earlier ones
+    for ranges, width_class in ((wide, WIDE), (narrow, NARROW), (combining, COMBINING),
+                                (CONTROL, NONPRINTABLE), (ZERO_WIDTH, ZERO)):
+        for start, end in ranges:
+            classes[start:end + 1] = bytes([width_class]) * (end - start + 1)
+    return classes
+
+
+def pack(classes):
+    """
+    (block_bits, stage1, stage2) with the block size giving the smallest
+    tables, among those whose distinct blocks can be numbered in one byte
+    """
+    best = None
+    for block_bits in range(6, 13):
+        size = 1 << block_bits
+        numbers = {}
+        stage1 = bytearray()
+        stage2 = bytearray()
+        for start in range(0, len(classes), size):
+            block = bytes(classes[start:start + size])
+            number = numbers.get(block)
+            if number is None:
+                number = numbers[block] = len(numbers)
+                stage2 += block
+            stage1.append(number & 0xFF)
+        if len(numbers) <= 256 and (best is None or len(stage1) + len(stage2) < len(best[1]) + len(best[2])):
+            best = block_bits, bytes(stage1), bytes(stage2)
+    if best is None:
+        raise ValueError("too many distinct blocks")
+    return best
+
+
+def bytes_literal(name, data, width=72):
+    lines, line = [], ""
+    for i, byte in enumerate(data):
+        char = chr(byte)
+        if " " <= char <= "~" and char not in "\\'":
+            token = char
+        elif byte < 8 and not (i + 1 < len(data) and 0x30 <= data[i + 1] <= 0x37):
+            # short octal escape for the width classes, unless a digit follows
+            token = "\\%o" % byte
+        else:
+            token = "\\x%02x" % byte
+        if len(line) + len(token) > width:
+            lines.append(line)
+            line = ""
+        line += token
+    lines.append(line)
+    return "%s = (\n%s\n)\n" % (name, "\n".join("    b'%s'" % line for line in lines))
+
+
+def write_table(path, version, source, block_bits, stage1, stage2):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('"""Width class table. Created by update_tables.py."""\n')
+        f.write("# Source: %s\n" % source)
+        f.write("# The width class of code point ucs is\n")
+        f.write("#     STAGE2[STAGE1[ucs >> BLOCK_BITS] << BLOCK_BITS | ucs & (1 << BLOCK_BITS) - 1]\n")
+        f.write("UNICODE_VERSION = %r\n" % version)
+        f.write("BLOCK_BITS = %d\n" % block_bits)
+        f.write(bytes_literal("STAGE1", stage1))
+        f.write(bytes_literal("STAGE2", stage2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--unicode-data", help="path of UnicodeData.txt")
+    parser.add_argument("--east-asian-width", help="path of EastAsianWidth.txt")
+    parser.add_argument("--unicode-version", help="version of the files, for the record")
+    parser.add_argument("--output", default=TARGET)
+    options = parser.parse_args()
+
+    if options.unicode_data and options.east_asian_width:
+        version = options.unicode_version or "unknown"
+        source = "%s, %s" % (os.path.basename(options.unicode_data),
+                             os.path.basename(options.east_asian_width))
+        combining = combining_from_file(options.unicode_data)
+        wide, narrow = wide_from_file(options.east_asian_width)
+    elif options.unicode_data or options.east_asian_width:
+        parser.error("--unicode-data and --east-asian-width go together")
+    else:
+        version, source, combining, wide, narrow = from_unicodedata()
+    block_bits, stage1, stage2 = pack(width_classes(combining, wide, narrow))
+    write_table(options.output, version, source, block_bits, stage1, stage2)
+    print("%s: Unicode %s, %d byte blocks, %d + %d bytes" % (
+        options.output, version, 1 << block_bits, len(stage1), len(stage2)))
+
+
+if __name__ == "__main__":
+    main()
@@ -70,36 +70,19 @@ Latest version: http://www.cl.cam.ac.uk/~mgk25/ucs/wcwidth.c
 """
 
 from __future__ import division
-from .table_wide import WIDE_EASTASIAN
-from .table_comb import NONZERO_COMBINING
+from .table_width import BLOCK_BITS as _BLOCK_BITS, STAGE1 as _STAGE1, STAGE2 as _STAGE2
+from .table_width import UNICODE_VERSION  # noqa
 
+# Width classes of the lookup table of table_width.py, a two-level table
+# of the class of every code point generated by update_tables.py: the
+# number of the block of a code point, then its class within that block.
+_NONPRINTABLE, _ZERO, _NARROW, _WIDE, _COMBINING = range(5)
+# what wcwidth() returns for each class
+_WCWIDTH = (-1, 0, 1, 2, -1)
+# what each class adds to wcswidth() (None: the string is not printable)
+_WCSWIDTH = (None, 0, 1, 2, 0)
 
-def _bisearch(ucs, table):
-    """
-    Auxiliary function for binary search in interval table.
-
-    :param ucs: a single unicode character's ordinal value.
-    :type ucs: int
-    :param table: a lookup table of tuples in form of ``[(start, end), ...]``.
-    :type table: list
-    :rtype int
-    :returns: 1 if ordinal value ucs is found within lookup table, else 0.
-    """
-    lbound = 0
-    ubound = len(table) - 1
-
-    if ucs < table[0][0] or ucs > table[ubound][1]:
-        return 0
-    while ubound >= lbound:
-        mid = (lbound + ubound) // 2
-        if ucs > table[mid][1]:
-            lbound = mid + 1
-        elif ucs < table[mid][0]:
-            ubound = mid - 1
-        else:
-            return 1
-
-    return 0
+_BLOCK_MASK = (1 << _BLOCK_BITS) - 1
 
 
 def wcwidth(wc):
@@ -157,29 +140,7 @@ def wcwidth(wc):
     # pylint: disable=C0103
     #         Invalid argument name "wc"
     ucs = ord(wc)
-
-    # NOTE: created by hand, there isn't anything identifiable other than
-    # general Cf category code to identify these, and some characters in Cf
-    # category code are of non-zero width.
-    if (0 == ucs or
-            0x034F == ucs or
-            0x200B <= ucs <= 0x200F or
-            0x2028 == ucs or
-            0x2029 == ucs or
-            0x202A <= ucs <= 0x202E or
-            0x2060 <= ucs <= 0x2063):
-        return 0
-
-    # C0/C1 control characters
-    if ucs < 32 or 0x07F <= ucs < 0x0A0:
-        return -1
-
-    # combining characters have indeterminate effects unless
-    # combined with additional characters.
-    if _bisearch(ucs, NONZERO_COMBINING):
-        return -1
-
-    return 1 + _bisearch(ucs, WIDE_EASTASIAN)
+    return _WCWIDTH[_STAGE2[_STAGE1[ucs >> _BLOCK_BITS] << _BLOCK_BITS | ucs & _BLOCK_MASK]]
 
 
 def wcswidth(pwcs, n=None):
@@ -193,16 +154,17 @@ def wcswidth(pwcs, n=None):
     # pylint: disable=C0103
     #         Invalid argument name "n"
 
-    end = len(pwcs) if n is None else n
-    idx = slice(0, end)
+    if n is not None:
+        pwcs = pwcs[:n]
+    if pwcs.isascii() and pwcs.isprintable():
+        # one column per character, no need to look at them one by one
+        return len(pwcs)
+    stage1, stage2, widths = _STAGE1, _STAGE2, _WCSWIDTH
     width = 0
-    for char in pwcs[idx]:
-        wcw = wcwidth(char)
-        if wcw < 0:
-            ucs = ord(char)
-            if _bisearch(ucs, NONZERO_COMBINING):
-                continue
+    for char in pwcs:
+        ucs = ord(char)
+        wcw = widths[stage2[stage1[ucs >> _BLOCK_BITS] << _BLOCK_BITS | ucs & _BLOCK_MASK]]
+        if wcw is None:
             return -1
-        else:
-            width += wcw
+        width += wcw
     return width